@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+    Throughput of the iterative traversals on linked list shaped graphs.
+    Run from the repository root:
+        python -m benchmarks.depth [max exponent]
+"""
+from sys import argv
+import time
+
+from benchmarks.generators import chain
+from graphius.graphius import Graphius
+
+
+def timed(function, *args):
+    """ Returns the wall time of one call, in seconds """
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def run(depth):
+    """ Times each traversal on a fresh chain of the given depth.
+    returns a dict of nodes per second, indexed by traversal name """
+    data = chain(depth)
+    result = {}
+
+    g = Graphius(data)
+    result['dfs'] = depth / timed(g.dfs, g.nodes[1])
+    result['postOrderMerge'] = depth / timed(g.postOrderMerge)
+
+    # Collapsing the second node marks the whole chain below it
+    g = Graphius(data)
+    collapsable = {g.nodes[2]: g.nodes[2]}
+    result['mergeHelper'] = depth / timed(
+        g.mergeHelperIterative, g.nodes[1], collapsable)
+
+    return result
+
+
+def main():
+    """ Print throughput at depths 10^3 up to 10^max exponent """
+    maxExponent = int(argv[1]) if len(argv) > 1 else 6
+    print("{:>10} {:>16} {:>16} {:>16}".format(
+        'depth', 'dfs', 'postOrderMerge', 'mergeHelper'))
+    for exponent in range(3, maxExponent + 1):
+        depth = 10 ** exponent
+        result = run(depth)
+        print("{:>10} {:>16,.0f} {:>16,.0f} {:>16,.0f}".format(
+            depth,
+            result['dfs'],
+            result['postOrderMerge'],
+            result['mergeHelper']))
+
+
+if __name__ == "__main__":
+    main()
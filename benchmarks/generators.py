@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+    Seeded generators of synthetic graphs, as JSON style node records.
+    Every generator takes the node count first and a seed last, and
+    returns the same graph for the same arguments.
+"""
+import random
+
+# Small alphabet, so that subtrees repeat
+ALPHABET = 'ABCD'
+
+
+def chain(count, seed=0):
+    """ A linked list of count nodes, alternating between two values so
+    nothing merges. Deep enough to break recursive traversals """
+    return [
+        {'id': i, 'value': 'AB'[i % 2],
+         'children': [i + 1] if i < count else []}
+        for i in range(1, count + 1)]
+
+
+def fanOut(count, seed=0):
+    """ One root with count - 1 leaf children """
+    rng = random.Random(seed)
+    return [{'id': 1, 'value': 'R', 'children': list(range(2, count + 1))}] + [
+        {'id': i, 'value': rng.choice(ALPHABET), 'children': []}
+        for i in range(2, count + 1)]
+
+
+def karyTree(count, k=2, seed=0):
+    """ A complete k-ary tree of count nodes over a small alphabet, so
+    that lower levels are highly duplicated """
+    rng = random.Random(seed)
+    return [
+        {'id': i, 'value': rng.choice(ALPHABET),
+         'children': [
+             j for j in range(k * (i - 1) + 2, k * i + 2) if j <= count]}
+        for i in range(1, count + 1)]
+
+
+def randomDag(count, edges=2, seed=0):
+    """ A random DAG with about edges children per node. Children always
+    have larger ids than their parents, so there are no cycles """
+    rng = random.Random(seed)
+    return [
+        {'id': i, 'value': rng.choice(ALPHABET),
+         'children': sorted({
+             rng.randrange(i + 1, count + 1)
+             for _ in range(edges) if i < count})}
+        for i in range(1, count + 1)]
+
+
+def sameValue(count, seed=0):
+    """ Every node has the same value but different children: each node
+    points at the next one, and sometimes at another random later one.
+    Defeats any lookup keyed on value alone """
+    rng = random.Random(seed)
+    nodes = []
+    for i in range(1, count + 1):
+        children = [i + 1] if i < count else []
+        if i < count - 1 and rng.random() < 0.5:
+            children.append(rng.randrange(i + 2, count + 1))
+        nodes.append({'id': i, 'value': 'A', 'children': children})
+    return nodes
+
+
+def forest(count, size=50, seed=0):
+    """ Random trees of size nodes each, count nodes in total, over a
+    small alphabet so that many subtrees repeat across trees """
+    rng = random.Random(seed)
+    nodes = []
+    for base in range(0, count, size):
+        treeSize = min(size, count - base)
+        children = [[] for _ in range(treeSize)]
+        for i in range(1, treeSize):
+            children[rng.randrange(i)].append(base + i + 1)
+        for i in range(treeSize):
+            nodes.append({
+                'id': base + i + 1,
+                'value': rng.choice(ALPHABET),
+                'children': children[i]})
+    return nodes
+
+
+# Generators by name, for the runner
+GENERATORS = {
+    'chain': chain,
+    'fanOut': fanOut,
+    'karyTree': karyTree,
+    'randomDag': randomDag,
+    'sameValue': sameValue,
+    'forest': forest,
+}
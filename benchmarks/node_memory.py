@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+    Peak memory per node of the slotted GraphiusNode, against the
+    original __dict__ based layout. Run from the repository root:
+        python -m benchmarks.node_memory [node count]
+"""
+from sys import argv
+import tracemalloc
+
+from graphius.node import GraphiusNode
+
+
+class LegacyGraphiusNode(object):
+    """ The original node layout: a __dict__, values as given and
+    a type check on every addNeighbor call """
+    def __init__(self, id, value):
+        self.id = id
+        self.value = value
+        self.neighbors = set()
+        self.safe = True
+
+    def addNeighbor(self, node):
+        assert(type(node) == LegacyGraphiusNode)
+        self.neighbors.add(node)
+
+
+def build(nodeClass, count):
+    """ Build a chain of count nodes over a handful of values.
+    Values are fresh strings, as json.load would return them """
+    nodes = [
+        nodeClass(i, ''.join(['value', str(i % 8)]))
+        for i in range(count)]
+    for i in range(count - 1):
+        nodes[i].addNeighbor(nodes[i + 1])
+    return nodes
+
+
+def peakPerNode(nodeClass, count):
+    """ Returns the tracemalloc peak in bytes per node """
+    tracemalloc.start()
+    nodes = build(nodeClass, count)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del nodes
+    return peak / count
+
+
+def main():
+    """ Print peak bytes per node for both layouts """
+    count = int(argv[1]) if len(argv) > 1 else 100000
+    legacy = peakPerNode(LegacyGraphiusNode, count)
+    slotted = peakPerNode(GraphiusNode, count)
+    print("{:>10} {:>12} {:>12}".format('nodes', 'legacy', 'slotted'))
+    print("{:>10} {:>12,.1f} {:>12,.1f}".format(count, legacy, slotted))
+    print("slotted nodes use {:.0%} of the legacy peak".format(
+        slotted / legacy))
+
+
+if __name__ == "__main__":
+    main()
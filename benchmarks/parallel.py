@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+    Speedup of merge(engine='parallel') over the serial hashcons engine,
+    against the number of worker processes, on a forest of many small
+    components. Run from the repository root:
+        python -m benchmarks.parallel [component count] [max workers]
+"""
+from sys import argv
+import os
+import time
+
+from benchmarks.generators import forest
+from graphius.graphius import Graphius
+
+
+def timedMerge(data, **kwargs):
+    """ Returns the wall time of one merge on a fresh graph, in seconds """
+    g = Graphius(data)
+    start = time.perf_counter()
+    g.merge(**kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    """ Print merge time and speedup for 1 up to max workers """
+    count = int(argv[1]) if len(argv) > 1 else 4000
+    maxWorkers = int(argv[2]) if len(argv) > 2 else os.cpu_count() or 1
+    data = forest(count * 50, size=50)
+
+    serial = timedMerge(data, engine='hashcons')
+    print("{} nodes in {} components, {} CPUs".format(
+        len(data), count, os.cpu_count()))
+    print("{:>10} {:>10} {:>10}".format('workers', 'seconds', 'speedup'))
+    print("{:>10} {:>10.3f} {:>10.2f}".format('hashcons', serial, 1.0))
+    for workers in range(1, maxWorkers + 1):
+        seconds = timedMerge(data, engine='parallel', workers=workers)
+        print("{:>10} {:>10.3f} {:>10.2f}".format(
+            workers, seconds, serial / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+    Times every Graphius operation on every synthetic generator at
+    increasing sizes, and fits a scaling exponent to each series.
+    Results are printed as JSON, so runs can be stored and compared.
+    Run from the repository root:
+        python -m benchmarks.runner [--sizes 1000,10000] [--output file]
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generators import GENERATORS
+from graphius.graphius import Graphius
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The brute force merge is quadratic and recursive, so it is only timed
+# up to this many nodes, and skipped when it runs out of stack
+BRUTEFORCE_LIMIT = 500
+
+
+def timeParse(data, path):
+    start = time.perf_counter()
+    Graphius(data)
+    return time.perf_counter() - start
+
+
+def timePostOrderMerge(data, path):
+    g = Graphius(data)
+    start = time.perf_counter()
+    g.postOrderMerge()
+    return time.perf_counter() - start
+
+
+def timeMerge(data, path):
+    if len(data) > BRUTEFORCE_LIMIT:
+        return None
+    g = Graphius(data)
+    start = time.perf_counter()
+    try:
+        g.merge()
+    except RecursionError:
+        return None
+    return time.perf_counter() - start
+
+
+def timeGetNodes(data, path):
+    g = Graphius(data)
+    g.postOrderMerge()
+    start = time.perf_counter()
+    g.getNodes()
+    return time.perf_counter() - start
+
+
+def timeCli(data, path):
+    """ End to end, including interpreter start up and JSON encoding """
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'cli.py'), path],
+        check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+OPERATIONS = {
+    'parse': timeParse,
+    'postOrderMerge': timePostOrderMerge,
+    'merge': timeMerge,
+    'getNodes': timeGetNodes,
+    'cli': timeCli,
+}
+
+
+def exponent(points):
+    """ Least squares slope of log(seconds) against log(size), so a
+    linear operation scores about 1 and a quadratic one about 2 """
+    points = [(math.log(n), math.log(t)) for n, t in points if t > 0]
+    if len(points) < 2:
+        return None
+    meanX = sum(x for x, _ in points) / len(points)
+    meanY = sum(y for _, y in points) / len(points)
+    spread = sum((x - meanX) ** 2 for x, _ in points)
+    if not spread:
+        return None
+    return sum((x - meanX) * (y - meanY) for x, y in points) / spread
+
+
+def run(generators, operations, sizes, repeat=1, seed=0):
+    """ Time every operation on every generator and size, keeping the
+    best of repeat runs. returns a dict of results and exponents """
+    results = []
+    exponents = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in generators:
+            series = {operation: [] for operation in operations}
+            for size in sizes:
+                data = GENERATORS[name](size, seed=seed)
+                path = os.path.join(directory, 'graph.json')
+                with open(path, 'w') as fp:
+                    json.dump(data, fp)
+                for operation in operations:
+                    times = [
+                        OPERATIONS[operation](data, path)
+                        for _ in range(repeat)]
+                    if None in times:
+                        continue
+                    seconds = min(times)
+                    series[operation].append((len(data), seconds))
+                    results.append({
+                        'generator': name,
+                        'operation': operation,
+                        'size': len(data),
+                        'seconds': seconds
+                    })
+            for operation in operations:
+                exponents.append({
+                    'generator': name,
+                    'operation': operation,
+                    'exponent': exponent(series[operation])
+                })
+    return {'results': results, 'exponents': exponents}
+
+
+def parseArgs(args):
+    """ Parse command line arguments for the benchmark runner """
+    parser = argparse.ArgumentParser(
+        prog='benchmarks.runner',
+        description="Time Graphius operations on synthetic graphs.")
+    parser.add_argument(
+        '--sizes', default='125,250,500,2000,8000',
+        help="comma separated node counts")
+    parser.add_argument(
+        '--generators', default=','.join(GENERATORS),
+        help="comma separated generator names")
+    parser.add_argument(
+        '--operations', default=','.join(OPERATIONS),
+        help="comma separated operation names")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output', help="write the JSON results here instead of stdout")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """ Run the benchmarks and print or save the results """
+    options = parseArgs(sys.argv[1:] if args is None else args)
+    report = run(
+        options.generators.split(','),
+        options.operations.split(','),
+        [int(size) for size in options.sizes.split(',')],
+        options.repeat, options.seed)
+    if options.output:
+        with open(options.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+    Throughput of merge(engine='vectorized') on the CSR backend against
+    postOrderMerge on GraphiusNode objects, on complete binary trees
+    over a small alphabet. Run from the repository root:
+        python -m benchmarks.vectorized [node count]
+"""
+from sys import argv
+import time
+
+from benchmarks.generators import karyTree
+from graphius.graphius import Graphius
+from graphius.vectorized import requireNumpy
+
+
+def timed(function):
+    """ Returns the wall time of one call, in seconds """
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    """ Print merge time and nodes per second for both paths """
+    count = int(argv[1]) if len(argv) > 1 else 10 ** 6
+    data = karyTree(count, k=2)
+    requireNumpy()  # Keep the import out of the timings
+
+    g = Graphius(data)
+    serial = timed(g.postOrderMerge)
+    g = Graphius(data, backend='csr')
+    vectorized = timed(lambda: g.merge(engine='vectorized'))
+
+    print("{} nodes, {} after merging".format(count, len(g.nodes)))
+    print("{:>16} {:>10} {:>14}".format('merge', 'seconds', 'nodes/s'))
+    print("{:>16} {:>10.3f} {:>14,.0f}".format(
+        'postOrderMerge', serial, count / serial))
+    print("{:>16} {:>10.3f} {:>14,.0f}".format(
+        'vectorized', vectorized, count / vectorized))
+    print("speedup {:.1f}x".format(serial / vectorized))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,229 @@
 from sys import argv
+import argparse
 import json
+import os
+import sys
+import time
 from graphius.graphius import Graphius
-from pprint import pprint
+from graphius.stream import iterRecords, writeRecords
+
+
+def parseArgs(args):
+    """ Parse command line arguments for the Graphius CLI """
+    parser = argparse.ArgumentParser(
+        prog='graphius',
+        description="Collapse redundant subtrees in a graph.")
+    parser.add_argument(
+        'file',
+        help="JSON file of graph nodes, or - for stdin")
+    parser.add_argument(
+        '--stream', action='store_true',
+        help="read node records one at a time, from a JSON array "
+             "or newline delimited JSON")
+    parser.add_argument(
+        '--format', choices=('json', 'ndjson', 'columnar'), default='json',
+        help="write merged nodes as a JSON array (the default), "
+             "as newline delimited JSON, or as one JSON object of "
+             "parallel ids, values, offsets and neighbors lists")
+    parser.add_argument(
+        '--stats', action='store_true',
+        help="print time per phase and merge counts to stderr")
+    parser.add_argument(
+        '--cache', metavar='PATH',
+        help="SQLite file of subtree digests and their canonical ids, "
+             "shared across runs so known subtrees keep their ids")
+    parser.add_argument(
+        '--cache-size', type=int, default=1000000, metavar='N',
+        help="most entries kept in the cache, least recently used "
+             "entries are evicted first (default 1000000)")
+    parser.add_argument(
+        '--external', action='store_true',
+        help="merge out of core, through a SQLite database on disk, "
+             "for graphs that do not fit in memory")
+    parser.add_argument(
+        '--memory-budget', type=int, default=256, metavar='MB',
+        help="memory to stay under with --external (default 256)")
+    parser.add_argument(
+        '--temp-dir', metavar='DIR',
+        help="directory for the --external database")
+    return parser.parse_args(args)
+
+
+def parseBatchArgs(args):
+    """ Parse command line arguments for the batch subcommand """
+    parser = argparse.ArgumentParser(
+        prog='graphius batch',
+        description="Collapse redundant subtrees in many graph files.")
+    parser.add_argument(
+        'inputs', nargs='+',
+        help="JSON or NDJSON files, directories or glob patterns")
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help="number of worker processes (default: one per CPU)")
+    parser.add_argument(
+        '--output-dir', metavar='DIR',
+        help="write each merged graph to DIR under its input file name. "
+             "Otherwise one NDJSON line per file is written to stdout")
+    parser.add_argument(
+        '--format', choices=('json', 'ndjson'), default='json',
+        help="format of the files written to --output-dir")
+    return parser.parse_args(args)
+
+
+def batchMain(args):
+    """ Merge many files. Files that fail are reported on stderr and as
+    error lines, without stopping the batch.
+    returns 1 if any file failed, 0 otherwise """
+    # Subcommands import their modules here, to keep plain runs quick
+    from graphius.batch import expandInputs, mergeFiles
+    options = parseBatchArgs(args)
+    if options.output_dir:
+        os.makedirs(options.output_dir, exist_ok=True)
+
+    failed = 0
+    for path, result, error in mergeFiles(
+            expandInputs(options.inputs), options.output_dir,
+            options.format, options.workers):
+        if error is not None:
+            failed += 1
+            sys.stderr.write("{}: {}\n".format(path, error))
+            record = {'file': path, 'error': error}
+        elif options.output_dir:
+            record = {'file': path, 'nodes': result}
+        else:
+            record = {'file': path, 'merged': result}
+        sys.stdout.write(json.dumps(record) + '\n')
+    return 1 if failed else 0
+
+
+def parseServeArgs(args):
+    """ Parse command line arguments for the serve subcommand """
+    from graphius.server import MAX_BODY
+    parser = argparse.ArgumentParser(
+        prog='graphius serve',
+        description="Serve merges over HTTP: POST /merge, GET /metrics.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument(
+        '--unix', metavar='PATH',
+        help="listen on a Unix socket at PATH instead of a port")
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help="number of worker processes (default: one per CPU)")
+    parser.add_argument(
+        '--max-pending', type=int, default=None, metavar='N',
+        help="merges queued or running before new ones get 503 "
+             "(default: twice the workers)")
+    parser.add_argument(
+        '--max-body', type=int, default=MAX_BODY >> 20, metavar='MB',
+        help="largest request body accepted, in MB "
+             "(default: {})".format(MAX_BODY >> 20))
+    return parser.parse_args(args)
+
+
+def serveMain(args):
+    """ Run the merge service until interrupted """
+    import asyncio
+    from graphius.server import serve
+    options = parseServeArgs(args)
+    try:
+        asyncio.run(serve(
+            options.host, options.port, options.unix,
+            workers=options.workers, maxPending=options.max_pending,
+            maxBody=options.max_body << 20))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def parseReportArgs(args):
+    """ Parse command line arguments for the report subcommand """
+    parser = argparse.ArgumentParser(
+        prog='graphius report',
+        description="List repeated subtrees, by nodes saved by merging.")
+    parser.add_argument(
+        'file',
+        help="JSON or NDJSON file of graph nodes, or - for stdin")
+    parser.add_argument(
+        '--top', type=int, default=10, metavar='K',
+        help="number of repeated subtrees to list (default 10), "
+             "0 for all of them")
+    return parser.parse_args(args)
+
+
+def reportMain(args):
+    """ Print the duplicate subtree report of one graph as JSON """
+    options = parseReportArgs(args)
+    with openInput(options.file) as json_data:
+        g = Graphius.from_stream(json_data)
+    json.dump(g.duplicateReport(options.top or None), sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+def openInput(path):
+    """ Open the input file, with - meaning stdin """
+    if path == '-':
+        return sys.stdin
+    return open(path)
+
 
 def main(args=None):
     """ Main method for Graphius CLI """
-    if len(argv) != 2:
-        print("Error reading arguments")
+    args = argv[1:] if args is None else args
+    if args and args[0] == 'batch':
+        return batchMain(args[1:])
+    if args and args[0] == 'serve':
+        return serveMain(args[1:])
+    if args and args[0] == 'report':
+        return reportMain(args[1:])
+    options = parseArgs(args)
+    if options.external and options.format == 'columnar':
+        sys.exit("graphius: columnar output is not available with --external")
+
+    if options.external:
+        from graphius.external import externalMerge
+        with openInput(options.file) as json_data:
+            externalMerge(
+                iterRecords(json_data), sys.stdout, options.format,
+                memoryBudget=options.memory_budget << 20,
+                tempDir=options.temp_dir)
+        if options.format == 'json':
+            sys.stdout.write('\n')
         return
 
-    assert(len(argv) == 2)
-    FILEPATH = argv[1]
+    with openInput(options.file) as json_data:
+        if options.stream:
+            # Loading is part of the parse phase when streaming
+            g = Graphius.from_stream(json_data, stats=options.stats)
+        else:
+            start = time.perf_counter()
+            d = json.load(json_data)
+            loaded = time.perf_counter() - start
+            assert(type(d) is list)
+            assert(type(d[0] is dict))
 
-    with open(FILEPATH) as json_data:
-        d = json.load(json_data)
-        assert(type(d) is list)
-        assert(type(d[0] is dict))
+            g = Graphius(d, stats=options.stats)
+            g.addTime('load', loaded)
 
-        g = Graphius(d)
+    if options.cache:
+        from graphius.cache import SignatureCache
+        with SignatureCache(options.cache, options.cache_size) as cache:
+            # Roots are kept, as by postOrderMerge without a cache
+            g.merge(engine='hashcons', cache=cache, keepRoots=True)
+    else:
         g.postOrderMerge()
-        print(json.dumps(g.getNodes()))
+    if options.format == 'columnar':
+        json.dump(g.getNodesColumnar(), sys.stdout)
+        sys.stdout.write('\n')
+    else:
+        with g.phase('serialize'):
+            writeRecords(sys.stdout, g.iterNodes(), options.format)
+        if options.format == 'json':
+            sys.stdout.write('\n')
+    if options.stats:
+        json.dump(g.stats, sys.stderr, indent=2, sort_keys=True)
+        sys.stderr.write('\n')
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
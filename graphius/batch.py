@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import os
+
+from graphius.graphius import Graphius
+from graphius.stream import writeRecords
+
+# Extensions picked up when a directory is given
+EXTENSIONS = ('.json', '.ndjson')
+
+# Files handed to a worker at a time, to amortize inter process calls
+CHUNK_SIZE = 8
+
+
+def expandInputs(inputs):
+    """ Given a list of file paths, directories and glob patterns,
+    return the list of files they name. Directories contribute their
+    JSON and NDJSON files, in sorted order. Missing paths are kept,
+    so they are reported as errors like any other bad file """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(
+                os.path.join(item, name) for name in os.listdir(item)
+                if name.endswith(EXTENSIONS)))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item)))
+        else:
+            paths.append(item)
+    return paths
+
+
+def mergeFile(path, outputPath=None, format='json'):
+    """ Merge the graph in one JSON array or NDJSON file.
+    When outputPath is given, write the merged nodes there and return
+    their count, otherwise return the merged nodes.
+    returns a (path, result, error) tuple. error is a message, and
+    result is None, when the file could not be merged """
+    try:
+        with open(path) as fp:
+            g = Graphius.from_stream(fp)
+        g.postOrderMerge()
+        if outputPath is None:
+            return path, g.getNodes(), None
+        with open(outputPath, 'w') as fp:
+            count = writeRecords(fp, g.iterNodes(), format)
+            if format == 'json':
+                fp.write('\n')
+        return path, count, None
+    except Exception as e:
+        return path, None, "{}: {}".format(type(e).__name__, e)
+
+
+def mergeFiles(paths, outputDir=None, format='json', workers=None):
+    """ Merge many files in a pool of worker processes, see mergeFile.
+    outputDir:
+        directory to write each merged graph to, under the same file
+        name as its input. When None, merged nodes are returned instead.
+        An input whose output file name was already taken by an earlier
+        input is reported as an error, and not merged
+    workers:
+        number of worker processes, defaults to the number of CPUs.
+        With 1, files are merged in this process
+    returns an iterator of (path, result, error) tuples, in input order """
+    outputs = [
+        os.path.join(outputDir, os.path.basename(path))
+        if outputDir is not None else None
+        for path in paths]
+    clashes = {}  # Error messages, indexed by input position
+    owners = {}  # Input paths, indexed by output path
+    for i, output in enumerate(outputs):
+        if output is None:
+            continue
+        key = os.path.normcase(os.path.abspath(output))
+        if key in owners:
+            clashes[i] = (
+                "ValueError: {} would overwrite the output of {}".format(
+                    output, owners[key]))
+        else:
+            owners[key] = paths[i]
+
+    todo = [i for i in range(len(paths)) if i not in clashes]
+    args = (
+        [paths[i] for i in todo], [outputs[i] for i in todo],
+        [format] * len(todo))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = map(mergeFile, *args)
+    else:
+        results = poolMap(workers, *args)
+    return withClashes(paths, clashes, results)
+
+
+def withClashes(paths, clashes, results):
+    """ Generator over the results of every path in order, with an error
+    for each clashing path in its place """
+    results = iter(results)
+    for i, path in enumerate(paths):
+        if i in clashes:
+            yield path, None, clashes[i]
+        else:
+            yield next(results)
+
+
+def poolMap(workers, *args):
+    """ Generator over mergeFile results from a process pool, shut down
+    once every result has been read """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(
+                mergeFile, *args, chunksize=CHUNK_SIZE):
+            yield result
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+    Coarsest partition refinement, after Paige and Tarjan's relational
+    coarsest partition algorithm. Two nodes end up in the same block
+    exactly when they have the same value and their children fall in
+    the same set of blocks, which is the bisimulation of the graph with
+    values as labels. It needs no traversal order, so cycles are fine,
+    and on acyclic graphs the blocks are the classes of signatures.
+
+    Every round takes a splitter block B out of a compound block S,
+    choosing the smaller of two blocks of S, and splits every block by
+    whether its nodes have children in B, and then in S - B. The count
+    of children each node has in each compound block is kept, so S - B
+    never has to be walked. Each node is in a splitter at most log n
+    times, for O(e log n) time overall.
+"""
+
+
+def bisimulationClasses(codes, offsets, children):
+    """ Given value codes, CSR offsets and child positions, as in
+    Graphius.flatten, assign every position a block id.
+    returns a list of block ids, indexed by position """
+    n = len(codes)
+
+    # Deduplicated edges, and the edges into each position
+    sources = []
+    targets = []
+    for x in range(n):
+        for y in set(children[offsets[x]:offsets[x + 1]]):
+            sources.append(x)
+            targets.append(y)
+    parentEdges = [[] for _ in range(n)]
+    for edge, y in enumerate(targets):
+        parentEdges[y].append(edge)
+
+    # Initial blocks: same value, and either both or neither have children
+    blockOf = [0] * n
+    blocks = []
+    firstBlock = {}
+    for x in range(n):
+        key = (codes[x], offsets[x + 1] > offsets[x])
+        if key not in firstBlock:
+            firstBlock[key] = len(blocks)
+            blocks.append(set())
+        blockOf[x] = firstBlock[key]
+        blocks[blockOf[x]].add(x)
+
+    # Compound blocks are unions of blocks. The blocks are stable with
+    # respect to every compound block. Initially there is one, with
+    # every node in it
+    compoundOf = [0] * len(blocks)
+    compounds = [set(range(len(blocks)))]
+    pending = {0} if len(blocks) > 1 else set()
+
+    # Children of each node in each compound block. A shared one element
+    # list per (node, compound block), referenced by the edge
+    cells = [[0] for _ in range(n)]
+    for x in sources:
+        cells[x][0] += 1
+    edgeCell = [cells[x] for x in sources]
+
+    def split(members):
+        """ Move the given nodes out of their blocks into new blocks,
+        one per block, unless that would empty the block """
+        byBlock = {}
+        for x in members:
+            byBlock.setdefault(blockOf[x], []).append(x)
+        for block, moved in byBlock.items():
+            if len(moved) == len(blocks[block]):
+                continue
+            newBlock = len(blocks)
+            blocks.append(set(moved))
+            blocks[block].difference_update(moved)
+            for x in moved:
+                blockOf[x] = newBlock
+            compound = compoundOf[block]
+            compoundOf.append(compound)
+            compounds[compound].add(newBlock)
+            pending.add(compound)
+
+    while pending:
+        compound = pending.pop()
+        members = compounds[compound]
+        if len(members) < 2:
+            continue
+        first, second = members.pop(), members.pop()
+        if len(blocks[first]) > len(blocks[second]):
+            first, second = second, first
+        members.add(second)
+        if len(members) > 1:
+            pending.add(compound)
+
+        # The smaller block becomes a compound block of its own
+        splitter = first
+        compoundOf[splitter] = len(compounds)
+        compounds.append({splitter})
+
+        # Parents of the splitter, with how many children each has in it,
+        # and the cell counting their children in the compound block
+        inSplitter = {}
+        inCompound = {}
+        edges = []
+        for y in blocks[splitter]:
+            for edge in parentEdges[y]:
+                x = sources[edge]
+                inSplitter[x] = inSplitter.get(x, 0) + 1
+                inCompound[x] = edgeCell[edge]
+                edges.append(edge)
+
+        # Split on having children in the splitter, then on also having
+        # children in the rest of the compound block
+        split(list(inSplitter))
+        split([
+            x for x, count in inSplitter.items()
+            if count < inCompound[x][0]])
+
+        # Move the counted edges over to the new compound block
+        newCells = {}
+        for x, count in inSplitter.items():
+            inCompound[x][0] -= count
+            newCells[x] = [count]
+        for edge in edges:
+            edgeCell[edge] = newCells[sources[edge]]
+
+    # Number the blocks in order of first appearance
+    numbers = {}
+    return [numbers.setdefault(blockOf[x], len(numbers)) for x in range(n)]
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import json
+import sqlite3
+
+
+class SignatureCache(object):
+    """
+        A persistent map from subtree digests to the canonical node id
+        kept for that subtree, stored in a SQLite file and shared across
+        runs. Used by merge(cache=...), so a subtree seen by an earlier
+        run keeps the same canonical id.
+        maxEntries:
+            the size cap. Entries least recently used by a merge are
+            evicted first
+        tick:
+            the number of the current merge. Every entry records the
+            tick it was last used at
+        hits, misses, evictions:
+            counts of lookups that did and did not find a digest, and of
+            evicted entries, since the cache was opened
+    """
+    def __init__(self, path, maxEntries=1000000):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            "digest BLOB PRIMARY KEY, canonical TEXT NOT NULL, "
+            "used INTEGER NOT NULL)")
+        self.connection.execute(
+            "CREATE TEMP TABLE wanted (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.tick = self.connection.execute(
+            "SELECT COALESCE(MAX(used), 0) FROM signatures").fetchone()[0]
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Commit and close the database """
+        self.connection.commit()
+        self.connection.close()
+
+    def lookup(self, digests):
+        """ Given an iterable of distinct digests, start a new tick and
+        mark the ones found as used by it.
+        returns a dict of canonical node ids, indexed by digest """
+        self.tick += 1
+        execute = self.connection.execute
+        # One join against a table of the wanted digests, rather than a
+        # query per digest
+        execute("DELETE FROM wanted")
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO wanted VALUES (?)",
+            ((digest,) for digest in sorted(digests)))
+        found = {
+            bytes(digest): json.loads(canonical)
+            for digest, canonical in execute(
+                "SELECT s.digest, s.canonical FROM wanted w "
+                "JOIN signatures s ON s.digest = w.digest")}
+        execute(
+            "UPDATE signatures SET used = ? "
+            "WHERE digest IN (SELECT digest FROM wanted)", (self.tick,))
+        wanted = execute("SELECT COUNT(*) FROM wanted").fetchone()[0]
+        execute("DELETE FROM wanted")
+        self.hits += len(found)
+        self.misses += wanted - len(found)
+        return found
+
+    def store(self, canonical):
+        """ Given a dict of canonical node ids indexed by digest, add or
+        replace their entries, then evict down to maxEntries """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)",
+            ((digest, json.dumps(nodeId), self.tick)
+             for digest, nodeId in canonical.items()))
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """ Delete the least recently used entries over maxEntries """
+        excess = len(self) - self.maxEntries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM signatures WHERE rowid IN ("
+                "SELECT rowid FROM signatures ORDER BY used, rowid LIMIT ?)",
+                (excess,))
+            self.evictions += excess
+
+    def stats(self):
+        """ Return a dict of lookup counts and the hit rate """
+        lookups = self.hits + self.misses
+        return {
+            'lookups': lookups,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self),
+            'hitRate': self.hits / lookups if lookups else 0.0
+        }
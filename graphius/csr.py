@@ -0,0 +1,565 @@
+# -*- coding: utf-8 -*-
+from array import array
+from bisect import bisect_left
+
+from graphius.bisimulation import bisimulationClasses
+from graphius.graphius import Graphius
+from graphius.snapshot import writeSnapshot
+from graphius.vectorized import collapseArrays, levelClasses, requireNumpy
+
+
+class CSRNode(object):
+    """ A read only view of one node of a CSRGraphius.
+    Views compare equal when they point at the same position of the
+    same graph, so they can be used wherever a GraphiusNode is read """
+    __slots__ = ('graph', 'index')
+
+    # Views are never marked for deletion
+    safe = True
+
+    def __init__(self, graph, index):
+        self.graph = graph
+        self.index = index
+
+    @property
+    def id(self):
+        return self.graph.ids[self.index]
+
+    @property
+    def value(self):
+        return self.graph.values[self.graph.codes[self.index]]
+
+    @property
+    def neighbors(self):
+        return frozenset(
+            CSRNode(self.graph, child)
+            for child in self.graph.childPositions(self.index))
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, CSRNode) and
+            self.graph is other.graph and
+            self.index == other.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.graph), self.index))
+
+    def __repr__(self):
+        return "CSRNode(id={}, value={!r})".format(self.id, self.value)
+
+
+class CSRNodes(object):
+    """ A read only mapping of CSRNode views, indexed by node id """
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, nodeId):
+        return CSRNode(self.graph, self.graph.position(nodeId))
+
+    def __contains__(self, nodeId):
+        try:
+            self.graph.position(nodeId)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.graph.ids)
+
+    def __len__(self):
+        return len(self.graph.ids)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return (CSRNode(self.graph, i) for i in range(len(self)))
+
+    def items(self):
+        return (
+            (nodeId, CSRNode(self.graph, i))
+            for i, nodeId in enumerate(self.graph.ids))
+
+
+class CSRGraphius(Graphius):
+    """
+        A Graphius backend holding the graph in flat arrays, built with
+        Graphius(data, backend='csr'), or by Graphius.load_binary. Nodes
+        are stored by position, in increasing id order. Node ids must be
+        integers, and all arrays hold 64 bit integers. The arrays are
+        only ever rebuilt whole: update parses the graph again with the
+        new records, and the views do not support edge level changes
+        such as unlink, or marking nodes for deletion.
+        ids:
+            an array of node ids, indexed by position
+        codes:
+            an array of value codes, indexed by position
+        values:
+            a list of distinct node values, indexed by value code
+        offsets:
+            an array of n + 1 offsets into children. The children of the
+            node at position i are children[offsets[i]:offsets[i + 1]]
+        children:
+            an array of child positions
+        nodes:
+            a read only mapping of CSRNode views, indexed by node id
+        resolved:
+            the ids the last postOrderMerge or update kept for each
+            class, which update keeps over new nodes, or None
+        buffer:
+            the memory mapped snapshot the arrays are read from, or None
+    """
+    def __init__(self, data, iterative=True, backend=None, stats=False):
+        self.iterative = iterative
+        self.equivalenceIndex = None
+        self.mergeStats = None
+        self.resolved = None
+        self.buffer = None
+        self.stats = {} if stats else None
+        with self.phase('parse'):
+            self.parse(data)
+        self.count('parsed', len(self.ids))
+
+    @classmethod
+    def fromArrays(cls, ids, codes, values, offsets, children, buffer=None):
+        """ Build a graph directly from its arrays, without parsing """
+        graph = cls.__new__(cls)
+        graph.iterative = True
+        graph.equivalenceIndex = None
+        graph.mergeStats = None
+        graph.resolved = None
+        graph.buffer = buffer
+        graph.stats = None
+        graph.ids, graph.codes, graph.values = ids, codes, values
+        graph.offsets, graph.children = offsets, children
+        return graph
+
+    @property
+    def nodes(self):
+        return CSRNodes(self)
+
+    def parse(self, data):
+        """
+            Given a json styled input, fill in the arrays in one pass.
+            Child ids are kept until every id is known, then replaced
+            by positions
+        """
+        ids = array('q')
+        codes = array('q')
+        counts = array('l')
+        childIds = array('q')
+        valueCodes = {}
+        self.values = []
+
+        for node in data:
+            ids.append(node['id'])
+            value = node['value']
+            if value not in valueCodes:
+                valueCodes[value] = len(self.values)
+                self.values.append(value)
+            codes.append(valueCodes[value])
+            children = set(node['children'])
+            counts.append(len(children))
+            childIds.extend(sorted(children))
+
+        # Sort positions by id, so ids can be found by bisection
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        starts = array('q', [0]) * len(ids)
+        for i in range(1, len(ids)):
+            starts[i] = starts[i - 1] + counts[i - 1]
+
+        self.ids = array('q', (ids[i] for i in order))
+        self.codes = array('q', (codes[i] for i in order))
+        self.offsets = array('q', [0])
+        self.children = array('q')
+        for i in order:
+            for childId in childIds[starts[i]:starts[i] + counts[i]]:
+                self.children.append(self.position(childId))
+            self.offsets.append(len(self.children))
+
+    def save_binary(self, path):
+        """ Write the arrays to a binary snapshot at path """
+        writeSnapshot(self, path)
+
+    def position(self, nodeId):
+        """ Return the position of a node id, raise KeyError if missing """
+        i = bisect_left(self.ids, nodeId)
+        if i == len(self.ids) or self.ids[i] != nodeId:
+            raise KeyError(nodeId)
+        return i
+
+    def childPositions(self, i):
+        """ Return the child positions of the node at position i """
+        return self.children[self.offsets[i]:self.offsets[i + 1]]
+
+    def iterNodes(self):
+        """ Generator over all the nodes of the graph, yielding the
+        same dicts as getNodes one at a time """
+        for i in range(len(self.ids)):
+            yield {
+                'id': self.ids[i],
+                'value': self.values[self.codes[i]],
+                'neighbors': [
+                    self.ids[child] for child in self.childPositions(i)]
+            }
+
+    def getNodesColumnar(self):
+        """ Same as Graphius.getNodesColumnar, read off the arrays """
+        with self.phase('serialize'):
+            ids = self.ids.tolist()
+            return {
+                'ids': ids,
+                'values': [self.values[code] for code in self.codes],
+                'offsets': self.offsets.tolist(),
+                'neighbors': [ids[child] for child in self.children]
+            }
+
+    def roots(self):
+        """ Return a set of root nodes of the graph """
+        return {CSRNode(self, i) for i in self.rootPositions()}
+
+    def clean(self):
+        """ Merges rebuild the arrays, so there are no dead nodes """
+
+    def update(self, data=(), edges=()):
+        """ Add nodes and edges, then merge again. Unlike the object
+        backend, the arrays are rebuilt from every record and merged
+        whole, but the same nodes are kept: roots, the nodes earlier
+        merges resolved to when their subtrees did not change, and else
+        the first node resolved again. When one replacement makes
+        several nodes equal at once, the object backend resolves them in
+        queue order rather than post order, and may keep another one.
+        data:
+            node records, as given to parse. Children may be new or
+            existing nodes
+        edges:
+            (parent id, child id) pairs between new or existing nodes
+        """
+        added = {}  # New child ids, indexed by parent id
+        for parentId, childId in edges:
+            added.setdefault(parentId, []).append(childId)
+        changed = set(added)
+
+        if self.resolved is None:
+            self.postOrderMerge()
+
+        with self.phase('parse'):
+            ids = self.ids
+            unindexed = set(ids) - self.resolved
+            records = [
+                {
+                    'id': ids[i],
+                    'value': self.values[self.codes[i]],
+                    'children': [
+                        ids[child] for child in self.childPositions(i)]
+                }
+                for i in range(len(ids))]
+            records.extend(data)
+            for i, record in enumerate(records):
+                if record['id'] in added:
+                    records[i] = dict(record, children=list(
+                        record['children']) + added.pop(record['id']))
+            if added:
+                raise KeyError(next(iter(added)))
+            # Parse apart, so a bad record leaves this graph unchanged
+            graph = CSRGraphius(records)
+        self.ids, self.codes = graph.ids, graph.codes
+        self.values = graph.values
+        self.offsets, self.children = graph.offsets, graph.children
+        self.count('parsed', len(records) - len(ids))
+
+        with self.phase('merge'):
+            self.walkMerge(self.resolved, changed, unindexed)
+        self.countMerge()
+
+    def rootPositions(self):
+        """ Return the set of positions of nodes without parents """
+        hasParent = bytearray(len(self.ids))
+        for child in self.children:
+            hasParent[child] = 1
+        return {i for i in range(len(self.ids)) if not hasParent[i]}
+
+    def positionClasses(self):
+        """ Assign every position an integer class id, bottom up from its
+        value code and the class ids of its children.
+        returns an array of class ids, indexed by position """
+        n = len(self.ids)
+        classes = array('q', [-1]) * n
+        active = bytearray(n)
+        table = {}  # (value code, tuple of child class ids) -> class id
+
+        for start in range(n):
+            if classes[start] != -1:
+                continue
+
+            # Iterative post order walk. Each frame is a position and
+            # the offset of its next child
+            stack = [[start, self.offsets[start]]]
+            active[start] = 1
+            while stack:
+                frame = stack[-1]
+                i = frame[0]
+                end = self.offsets[i + 1]
+                while (frame[1] < end and
+                       classes[self.children[frame[1]]] != -1):
+                    frame[1] += 1
+                if frame[1] < end:
+                    child = self.children[frame[1]]
+                    if active[child]:
+                        raise ValueError("Cycle detected at node {}".format(
+                            self.ids[child]))
+                    active[child] = 1
+                    stack.append([child, self.offsets[child]])
+                    continue
+
+                stack.pop()
+                active[i] = 0
+                key = (
+                    self.codes[i],
+                    tuple(sorted({
+                        classes[child] for child in self.childPositions(i)})))
+                classes[i] = table.setdefault(key, len(table))
+
+        return classes
+
+    def signatures(self):
+        """ Assign every node a canonical signature.
+        returns a dict of integer class ids, indexed by node id """
+        return dict(zip(self.ids, self.positionClasses()))
+
+    def bisimulationSignatures(self):
+        """ Same as Graphius.bisimulationSignatures, over the arrays """
+        return dict(zip(self.ids, bisimulationClasses(
+            self.codes, self.offsets, self.children)))
+
+    def applyPlan(self, plan):
+        """ Merge as planned by planMerge, rebuilding the arrays """
+        classes = array('q', (
+            self.position(plan.get(nodeId, nodeId)) for nodeId in self.ids))
+        self.canonicalize(classes, {i: i for i in set(classes)})
+
+    def postOrderMerge(self):
+        """ Merge all same subtrees, rebuilding the arrays. As on the
+        object backend, roots are kept even when they duplicate another
+        subtree, and the duplicate kept is the first one reached by a
+        post order walk in decreasing id order, so both backends give
+        the same output """
+        with self.phase('merge'):
+            self.walkMerge()
+        self.countMerge()
+
+    def walkMerge(self, preferred=(), changed=(), unindexed=()):
+        """ Keep the roots, and for each class the node the object
+        backend keeps: one of the preferred ids whose subtree did not
+        change, or else the first node resolved again, in the order of
+        postOrderPositions.
+        preferred:
+            ids kept by the last merge, as in the object backend's
+            equivalence index
+        changed:
+            ids of nodes that gained children. They are resolved again,
+            as are the parents of any of them merged away
+        unindexed:
+            ids of roots the last merge left out of the index. They are
+            only resolved again once they gain a parent """
+        ids = self.ids
+        roots = self.rootPositions()
+        classes = self.positionClasses()
+        rank = array('q', [0]) * len(ids)
+        for order, i in enumerate(self.postOrderPositions(roots)):
+            rank[i] = order
+
+        # Class ids are children first, so the kept node of every child
+        # class is known before its parents are resolved
+        members = {}
+        for i in range(len(ids)):
+            members.setdefault(classes[i], []).append(i)
+        category = bytearray(len(ids))  # 0 kept, 1 resolved, 2 skipped
+        representatives = {}
+        for classId in sorted(members):
+            positions = members[classId]
+            for i in positions:
+                if ids[i] in changed or any(
+                        category[child] == 1 and
+                        representatives[classes[child]] != child
+                        for child in self.childPositions(i)):
+                    category[i] = 1
+                elif ids[i] in unindexed and i in roots:
+                    category[i] = 2
+                elif ids[i] not in preferred:
+                    category[i] = 1
+            representatives[classId] = min(
+                positions, key=lambda i: (category[i], rank[i]))
+        rep = self.canonicalize(classes, representatives, roots)
+        self.resolved = {ids[i] for i in rep.values() if category[i] != 2}
+
+    def postOrderPositions(self, roots):
+        """ Generator over the positions below the given root positions,
+        children first. Roots and children are walked in decreasing id
+        order, as by Graphius.postOrderMerge """
+        visited = bytearray(len(self.ids))
+        for root in sorted(roots, reverse=True):
+            visited[root] = 1
+            stack = [(root, reversed(self.childPositions(root)))]
+            while stack:
+                i, children = stack[-1]
+                for child in children:
+                    if not visited[child]:
+                        visited[child] = 1
+                        stack.append(
+                            (child, reversed(self.childPositions(child))))
+                        break
+                else:
+                    stack.pop()
+                    yield i
+
+    def merge(self, engine='bruteforce', workers=None, cache=None,
+              keepRoots=False):
+        """ Function to merge all same subtrees in graph. Every engine
+        runs the same array canonicalization on this backend, see
+        Graphius.merge for the arguments """
+        if engine not in self.engines:
+            raise ValueError("Unknown merge engine: {}".format(engine))
+        if cache is not None and engine not in ('hashcons', 'parallel'):
+            raise ValueError(
+                "The signature cache needs the hashcons or parallel engine")
+        if keepRoots and engine == 'bruteforce':
+            raise ValueError("The bruteforce engine can not keep roots")
+        keep = self.rootPositions() if keepRoots else None
+        with self.phase('merge'):
+            if cache is not None:
+                self.cachedMerge(cache, keep=keep)
+            elif engine == 'vectorized' and keep is None:
+                self.vectorizedMerge()
+            elif engine == 'vectorized':
+                classes = levelClasses(self.codes, self.offsets, self.children)
+                self.canonicalize(array('q', classes.tolist()), keep=keep)
+            elif engine == 'bisimulation':
+                self.canonicalize(array('q', bisimulationClasses(
+                    self.codes, self.offsets, self.children)), keep=keep)
+            else:
+                self.canonicalize(keep=keep)
+        self.countMerge()
+
+    def countMerge(self):
+        """ Add the counts of the last canonicalization to the stats """
+        for name in ('lookups', 'hits'):
+            self.count(name, self.mergeStats[name])
+        self.count('visited', self.mergeStats['lookups'])
+        self.count('merged', self.mergeStats['hits'])
+        self.count('removed', self.mergeStats['hits'])
+
+    def hashconsMerge(self):
+        """ Merge all same subtrees by grouping nodes on their signature """
+        self.canonicalize()
+
+    def cachedMerge(self, cache, engine='hashcons', workers=None, keep=None):
+        """ Same as Graphius.cachedMerge, over the arrays """
+        classes = self.positionClasses()
+        digests = self.classDigests(dict(zip(self.ids, classes)))
+        known = cache.lookup(set(digests.values()))
+        representatives = {}
+        for classId, digest in digests.items():
+            if digest not in known:
+                continue
+            try:
+                i = self.position(known[digest])
+            except (KeyError, TypeError):
+                continue  # Cached ids may be missing, or not integers
+            if classes[i] == classId:
+                representatives[classId] = i
+
+        ids = self.ids
+        rep = self.canonicalize(classes, representatives, keep)
+        cache.store({
+            digests[classId]: ids[i] for classId, i in rep.items()
+            if representatives.get(classId) != i})
+        if self.stats is not None:
+            self.stats['cache'] = cache.stats()
+
+    def canonicalize(self, classes=None, representatives=None, keep=None):
+        """ Keep the node with the largest id of each signature, and point
+        it at the kept nodes of its children's signatures.
+        classes:
+            class ids indexed by position, positionClasses by default
+        representatives:
+            positions to keep instead, indexed by class id
+        keep:
+            a set of positions kept as well, such as roots
+        returns a dict of the kept positions, indexed by class id """
+        if classes is None:
+            classes = self.positionClasses()
+        keep = keep or set()
+        n = len(self.ids)
+        self.resolved = None
+
+        # Positions are in id order, so the last position of a class wins,
+        # unless the class has a kept position to reuse
+        rep = {}
+        for i in range(n):
+            rep[classes[i]] = i
+        for i in sorted(keep):
+            rep[classes[i]] = i
+        rep.update(representatives or {})
+
+        newPosition = array('q', [-1]) * n
+        kept = 0
+        for i in range(n):
+            if rep[classes[i]] == i or i in keep:
+                newPosition[i] = kept
+                kept += 1
+
+        ids = array('q')
+        codes = array('q')
+        offsets = array('q', [0])
+        children = array('q')
+        for i in range(n):
+            if newPosition[i] == -1:
+                continue
+            ids.append(self.ids[i])
+            codes.append(self.codes[i])
+            children.extend(sorted({
+                newPosition[rep[classes[child]]]
+                for child in self.childPositions(i)}))
+            offsets.append(len(children))
+
+        self.mergeStats = {
+            'lookups': n,
+            'hits': n - kept,
+            'misses': kept,
+            'classes': kept
+        }
+        self.ids, self.codes = ids, codes
+        self.offsets, self.children = offsets, children
+        return rep
+
+    def vectorizedMerge(self):
+        """ Same as canonicalize, with class ids assigned one height level
+        at a time by NumPy, and the arrays rebuilt by NumPy """
+        np = requireNumpy()
+        n = len(self.ids)
+        self.resolved = None
+        classes = levelClasses(self.codes, self.offsets, self.children)
+        kept, codes, offsets, children = collapseArrays(
+            self.codes, self.offsets, self.children, classes)
+
+        ids = np.frombuffer(self.ids, dtype=np.int64)[kept]
+        self.mergeStats = {
+            'lookups': n,
+            'hits': n - kept.size,
+            'misses': kept.size,
+            'classes': kept.size
+        }
+        self.ids = array('q', ids.tobytes())
+        self.codes = array('q', codes.tobytes())
+        self.offsets = array('q', offsets.tobytes())
+        self.children = array('q', children.tobytes())
+
+    def equivalenceStats(self):
+        """ Return the lookup counts of the last merge """
+        if self.mergeStats is None:
+            return super(CSRGraphius, self).equivalenceStats()
+        return dict(self.mergeStats)
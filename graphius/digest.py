@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+
+# Bytes per digest. 128 bits keeps accidental collisions out of reach
+DIGEST_SIZE = 16
+
+
+def encodeValue(value):
+    """ Return the bytes a node value contributes to its digest """
+    return json.dumps(value, sort_keys=True).encode('utf-8') + b'\x00'
+
+
+def nodeDigest(value, childDigests, encoded=None):
+    """ Given a JSON style node value and the digests of its children,
+    return the digest of the subtree. Digests only depend on content,
+    so they can be compared across processes and runs.
+    encoded:
+        encodeValue(value), for callers that cache it """
+    if encoded is None:
+        encoded = encodeValue(value)
+    return hashlib.blake2b(
+        encoded + b''.join(sorted(set(childDigests))),
+        digest_size=DIGEST_SIZE).digest()
+
+
+def recordDigests(records):
+    """ Given a list of (id, value, child ids) tuples, closed under
+    children, return a dict of subtree digests indexed by id """
+    children = {nodeId: childIds for nodeId, _, childIds in records}
+    values = {nodeId: value for nodeId, value, _ in records}
+    encodings = {}  # Encoded values, indexed by value
+    digests = {}
+
+    for start, _, _ in records:
+        if start in digests:
+            continue
+
+        # Iterative post order walk, as in Graphius.signatures
+        stack = [(start, iter(children[start]))]
+        active = {start}
+        while stack:
+            nodeId, childIds = stack[-1]
+            for childId in childIds:
+                if childId in digests:
+                    continue
+                if childId in active:
+                    raise ValueError(
+                        "Cycle detected at node {}".format(childId))
+                active.add(childId)
+                stack.append((childId, iter(children[childId])))
+                break
+            else:
+                stack.pop()
+                active.discard(nodeId)
+                value = values[nodeId]
+                encoded = encodings.get(value)
+                if encoded is None:
+                    encoded = encodings[value] = encodeValue(value)
+                digests[nodeId] = nodeDigest(
+                    value,
+                    [digests[childId] for childId in children[nodeId]],
+                    encoded)
+
+    return digests
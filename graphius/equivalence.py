@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+
+class EquivalenceIndex(object):
+    """
+        An index of resolved nodes, used while merging.
+        index:
+            a dictionary of nodes, indexed by (value, frozenset of neighbors).
+            Nodes sharing a value but not their children each get
+            their own slot
+        hits, misses:
+            counts of lookups that did and did not find another node
+    """
+    def __init__(self):
+        self.index = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def key(self, node):
+        """ Return the index key of a node """
+        return (node.value, frozenset(node.neighbors))
+
+    def resolve(self, node):
+        """ Given a node, return the indexed node with the same value
+        and neighbors. If there is none, index the node and return it """
+        resolved = self.index.setdefault(self.key(node), node)
+        if resolved is node:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return resolved
+
+    def discard(self, node):
+        """ Remove a node from the index. Must be called before the
+        node's neighbors change, while its key is still the same """
+        key = self.key(node)
+        if self.index.get(key) is node:
+            del self.index[key]
+
+    def stats(self):
+        """ Return a dict of lookup counts """
+        return {
+            'lookups': self.hits + self.misses,
+            'hits': self.hits,
+            'misses': self.misses,
+            'classes': len(self.index)
+        }
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+    Out of core merging, for graphs that do not fit in memory as
+    GraphiusNode objects. Node records are spilled to a SQLite database
+    on disk, subtree digests are computed one height level at a time,
+    leaves first, and the merged graph is read back in id order, one
+    node at a time. Like merge(engine='hashcons'), the node with the
+    largest id of each class of identical subtrees is kept.
+"""
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+
+from graphius.digest import nodeDigest
+from graphius.stream import writeRecords
+
+# Default memory budget, in bytes
+MEMORY_BUDGET = 256 << 20
+
+# Rough size of one node record on the Python side, in bytes
+RECORD_BYTES = 1024
+
+SCHEMA = (
+    # No column types, so ids keep their JSON type and order
+    "CREATE TABLE nodes ("
+    "id PRIMARY KEY, value TEXT NOT NULL, remaining INTEGER NOT NULL, "
+    "digest BLOB)",
+    "CREATE TABLE edges ("
+    "parent NOT NULL, child NOT NULL, PRIMARY KEY (parent, child)) "
+    "WITHOUT ROWID",
+    "CREATE TABLE frontier (id PRIMARY KEY) WITHOUT ROWID",
+    "CREATE TABLE level (id PRIMARY KEY) WITHOUT ROWID",
+    "CREATE TABLE canonical (digest BLOB PRIMARY KEY, id) WITHOUT ROWID",
+)
+
+
+class ExternalGraph(object):
+    """
+        A graph held in a SQLite database on disk.
+        path:
+            the database file. A temporary file, removed by close, when
+            None
+        memoryBudget:
+            bytes of memory to stay under. A quarter goes to SQLite's page
+            cache, which also bounds each sort, half to SQLite's heap
+            limit, and a quarter to batches of records in Python. Sorts
+            and indexes past the budget spill to temporary files. The
+            interpreter itself is not counted
+    """
+    def __init__(self, path=None, memoryBudget=MEMORY_BUDGET, tempDir=None):
+        self.temporary = path is None
+        if path is None:
+            handle, path = tempfile.mkstemp(suffix='.db', dir=tempDir)
+            os.close(handle)
+            os.remove(path)
+        self.path = path
+        self.batchSize = max(100, memoryBudget // 4 // RECORD_BYTES)
+        self.connection = sqlite3.connect(path)
+        for pragma in (
+                "PRAGMA journal_mode = OFF",
+                "PRAGMA synchronous = OFF",
+                "PRAGMA temp_store = FILE",
+                "PRAGMA cache_size = -{}".format(memoryBudget // 4 // 1024),
+                "PRAGMA soft_heap_limit = {}".format(memoryBudget // 2)):
+            self.connection.execute(pragma)
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Close the database, removing it if it was temporary """
+        self.connection.close()
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def load(self, records):
+        """ Spill an iterable of node records to disk, a batch at a time.
+        Children may come before or after their parents """
+        records = iter(records)
+        while True:
+            batch = list(itertools.islice(records, self.batchSize))
+            if not batch:
+                break
+            nodes = []
+            edges = []
+            for record in batch:
+                children = set(record['children'])
+                nodes.append((
+                    record['id'], json.dumps(record['value'], sort_keys=True),
+                    len(children)))
+                edges.extend((record['id'], child) for child in children)
+            self.connection.executemany(
+                "INSERT INTO nodes (id, value, remaining) VALUES (?, ?, ?)",
+                nodes)
+            self.connection.executemany(
+                "INSERT INTO edges VALUES (?, ?)", edges)
+
+        self.connection.execute("CREATE INDEX edges_child ON edges (child)")
+        missing = self.connection.execute(
+            "SELECT e.child FROM edges e LEFT JOIN nodes n ON n.id = e.child "
+            "WHERE n.id IS NULL LIMIT 1").fetchone()
+        if missing is not None:
+            raise KeyError(missing[0])
+
+    def merge(self):
+        """ Compute every subtree digest, height level by height level,
+        then pick the largest id of every digest as its canonical node """
+        execute = self.connection.execute
+        count = execute(
+            "INSERT INTO frontier SELECT id FROM nodes WHERE remaining = 0"
+        ).rowcount
+        while count:
+            self.digestFrontier()
+
+            # Parents whose last child was just digested are the next level.
+            # CROSS JOIN keeps SQLite walking the small frontier first
+            execute(
+                "UPDATE nodes SET remaining = remaining - ("
+                "SELECT COUNT(*) FROM edges e JOIN frontier f "
+                "ON f.id = e.child WHERE e.parent = nodes.id) "
+                "WHERE id IN (SELECT e.parent FROM frontier f "
+                "CROSS JOIN edges e ON e.child = f.id)")
+            execute(
+                "INSERT INTO level SELECT DISTINCT e.parent "
+                "FROM frontier f CROSS JOIN edges e ON e.child = f.id "
+                "JOIN nodes p ON p.id = e.parent WHERE p.remaining = 0")
+            execute("DELETE FROM frontier")
+            count = execute(
+                "INSERT INTO frontier SELECT id FROM level").rowcount
+            execute("DELETE FROM level")
+
+        cyclic = execute(
+            "SELECT id FROM nodes WHERE digest IS NULL LIMIT 1").fetchone()
+        if cyclic is not None:
+            raise ValueError("Cycle detected at node {}".format(cyclic[0]))
+        execute(
+            "INSERT INTO canonical SELECT digest, MAX(id) FROM nodes "
+            "GROUP BY digest")
+        self.connection.commit()
+
+    def digestFrontier(self):
+        """ Digest every node of the frontier, whose children all have
+        digests already, a batch at a time """
+        rows = self.connection.execute(
+            "SELECT f.id, n.value, c.digest FROM frontier f "
+            "JOIN nodes n ON n.id = f.id "
+            "LEFT JOIN edges e ON e.parent = f.id "
+            "LEFT JOIN nodes c ON c.id = e.child ORDER BY f.id")
+        groups = itertools.groupby(rows, key=lambda row: row[0])
+        # A second cursor, so updates do not disturb the read
+        update = self.connection.cursor()
+        while True:
+            batch = []
+            for nodeId, group in itertools.islice(groups, self.batchSize):
+                group = list(group)
+                # Values are stored as encodeValue encodes them
+                encoded = group[0][1].encode('utf-8') + b'\x00'
+                childDigests = [row[2] for row in group if row[2] is not None]
+                batch.append((nodeDigest(None, childDigests, encoded), nodeId))
+            if not batch:
+                break
+            update.executemany(
+                "UPDATE nodes SET digest = ? WHERE id = ?", batch)
+
+    def iterNodes(self):
+        """ Generator over the merged nodes in id order, yielding the same
+        dicts as Graphius.getNodes """
+        rows = self.connection.execute(
+            "SELECT c.id, n.value, k.id FROM canonical c "
+            "JOIN nodes n ON n.id = c.id "
+            "LEFT JOIN edges e ON e.parent = c.id "
+            "LEFT JOIN nodes d ON d.id = e.child "
+            "LEFT JOIN canonical k ON k.digest = d.digest "
+            "ORDER BY c.id")
+        for nodeId, group in itertools.groupby(rows, key=lambda row: row[0]):
+            group = list(group)
+            yield {
+                'id': nodeId,
+                'value': json.loads(group[0][1]),
+                'neighbors': sorted(
+                    {row[2] for row in group if row[2] is not None})
+            }
+
+
+def externalMerge(records, fp, format='json', **kwargs):
+    """ Merge an iterable of node records out of core, writing the merged
+    nodes to fp as in writeRecords. kwargs go to ExternalGraph.
+    returns the number of nodes written """
+    with ExternalGraph(**kwargs) as graph:
+        graph.load(records)
+        graph.merge()
+        return writeRecords(fp, graph.iterNodes(), format)
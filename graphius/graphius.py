@@ -1,5 +1,26 @@
 # -*- coding: utf-8 -*-
+from collections import deque
+from contextlib import contextmanager
+from operator import attrgetter
+import time
+
+from graphius.bisimulation import bisimulationClasses
+from graphius.digest import encodeValue, nodeDigest
+from graphius.equivalence import EquivalenceIndex
 from graphius.node import GraphiusNode
+from graphius.plan import canonicalIds
+from graphius.query import EquivalenceQuery
+from graphius.report import duplicateReport
+from graphius.snapshot import readSnapshot
+from graphius.stream import iterRecords
+from graphius.vectorized import levelClasses
+
+
+def byId(nodes):
+    """ Return nodes sorted by decreasing id. Merges walk nodes in this
+    order, so the duplicate kept does not depend on set order, and is
+    the largest id whenever ids grow along siblings """
+    return sorted(nodes, key=attrgetter('id'), reverse=True)
 
 
 class Graphius(object):
@@ -7,87 +28,420 @@ class Graphius(object):
         A class representing a graph.
         nodes:
             a dictionary holding data on nodes, indexed by node id
+        inDegree:
+            a dictionary holding the number of parents of each node,
+            indexed by node. Kept up to date by every edge change, so a
+            node is removed as soon as its last parent lets go of it
+        rootNodes:
+            the set of nodes without parents, kept up to date the same way
+        promoted:
+            while update runs, a list of the nodes that gained their first
+            parent, so they are resolved again. None otherwise
         mapping:
             a dictionary indexed by node value,
             containing a set of node ids
+        iterative:
+            when True (the default), traversals use an explicit stack
+            instead of Python recursion, so arbitrarily deep graphs
+            can be merged without raising the recursion limit
+        equivalenceIndex:
+            the EquivalenceIndex of the last postOrderMerge, or None
+        parentIndex:
+            a dictionary holding sets of parent nodes, indexed by node.
+            Built by the first update after a merge, and kept up to date
+            by update afterwards. None otherwise
+        backend:
+            'objects' (the default) keeps one GraphiusNode per node,
+            'csr' returns a CSRGraphius, which keeps the graph in flat arrays
+        stats:
+            None, unless the graph was built with stats=True. Then a dict
+            of wall time per phase under 'seconds', and counts of nodes
+            parsed, visited, merged and removed, and equivalence lookups
+            and hits. Counts are added in bulk once per phase, so
+            disabled instrumentation costs one check per phase
     """
-    def __init__(self, data):
+    # Backend used when none is given at construction time
+    defaultBackend = 'objects'
+
+    # Accepted values of merge's engine argument
+    engines = (
+        'bruteforce', 'hashcons', 'parallel', 'vectorized', 'bisimulation')
+
+    def __new__(cls, data=None, iterative=True, backend=None, stats=False):
+        backend = backend or cls.defaultBackend
+        if cls is Graphius and backend == 'csr':
+            from graphius.csr import CSRGraphius
+            cls = CSRGraphius
+        elif backend not in ('objects', 'csr'):
+            raise ValueError("Unknown backend: {}".format(backend))
+        return super(Graphius, cls).__new__(cls)
+
+    def __init__(self, data, iterative=True, backend=None, stats=False):
         self.nodes = {}  # GraphiusNode objects, indexed by id
-        self.childNodes = {}  # GraphiusNode objects, indexed by id
-        self.parse(data)
+        self.inDegree = {}  # Parent counts, indexed by GraphiusNode
+        self.rootNodes = set()
+        self.promoted = None
+        self.iterative = iterative
+        self.equivalenceIndex = None
+        self.parentIndex = None
+        self.stats = {} if stats else None
+        with self.phase('parse'):
+            self.parse(data)
+        self.count('parsed', len(self.nodes))
+
+    @contextmanager
+    def phase(self, name):
+        """ Add the wall time of the enclosed block to a phase of stats """
+        if self.stats is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addTime(name, time.perf_counter() - start)
+
+    def addTime(self, name, seconds):
+        """ Add seconds to a phase of stats, if enabled """
+        if self.stats is not None:
+            times = self.stats.setdefault('seconds', {})
+            times[name] = times.get(name, 0.0) + seconds
+
+    def count(self, name, amount):
+        """ Add amount to a counter of stats, if enabled """
+        if self.stats is not None:
+            self.stats[name] = self.stats.get(name, 0) + amount
+
+    @classmethod
+    def from_stream(cls, fp, **kwargs):
+        """ Build a graph from a file object holding a JSON array of
+        node records, or newline delimited JSON. Records are read and
+        linked one at a time, without loading the whole document """
+        return cls(iterRecords(fp), **kwargs)
+
+    @classmethod
+    def load_binary(cls, path):
+        """ Open a snapshot written by save_binary. The file is memory
+        mapped and read in place, so roots, getNodes and other read only
+        queries never build GraphiusNode objects.
+        returns a CSRGraphius """
+        from graphius.csr import CSRGraphius
+        buffer, ids, codes, offsets, children, values = readSnapshot(path)
+        return CSRGraphius.fromArrays(
+            ids, codes, values, offsets, children, buffer)
+
+    def save_binary(self, path):
+        """ Write the graph to a binary snapshot at path, in the layout
+        of the CSR backend. Node ids must be integers """
+        from graphius.csr import CSRGraphius
+        CSRGraphius(
+            {'id': node['id'], 'value': node['value'],
+             'children': node['neighbors']}
+            for node in self.iterNodes()).save_binary(path)
 
     def parse(self, data):
         """
-            Given a json styled input, fill in the graphius data structures
-            First, make every node without neighbor links. Then go back,
-            and add neighbor links
+            Given a json styled input, or any iterable of node records,
+            fill in the graphius data structures in a single pass.
+            Links to children that have not been read yet are kept
+            pending until the child arrives
+            returns a list of the new GraphiusNode objects
         """
+        pending = {}  # Lists of parent nodes, indexed by missing child id
+        added = []
 
         for node in data:
             nodeObj = GraphiusNode(id=node['id'], value=node['value'])
             self.nodes[nodeObj.id] = nodeObj
+            self.inDegree[nodeObj] = 0
+            self.rootNodes.add(nodeObj)
+            added.append(nodeObj)
 
-        # Create links to nieghbors:
-        for node in data:
-            nodeObj = self.nodes[node['id']]
+            # Resolve forward references to this node
+            for parent in pending.pop(nodeObj.id, ()):
+                self.link(parent, nodeObj)
+
+            # Create links to nieghbors:
             for neighborId in node['children']:
-                nodeObj.addNeighbor(self.nodes[neighborId])
-                self.childNodes[neighborId] = self.nodes[neighborId]
+                neighbor = self.nodes.get(neighborId)
+                if neighbor is None:
+                    pending.setdefault(neighborId, []).append(nodeObj)
+                else:
+                    self.link(nodeObj, neighbor)
+
+        if pending:
+            # Children that never arrived
+            raise KeyError(next(iter(pending)))
+        return added
+
+    def link(self, parent, child):
+        """ Add child as a neighbor of parent, keeping in-degrees, roots
+        and the parent index up to date """
+        if child in parent.neighbors:
+            return
+        parent.addNeighbor(child)
+        degree = self.inDegree[child]
+        if degree == 0:
+            self.rootNodes.discard(child)
+            if self.promoted is not None:
+                self.promoted.append(child)
+        self.inDegree[child] = degree + 1
+        if self.parentIndex is not None:
+            self.parentIndex.setdefault(child, set()).add(parent)
+
+    def unlink(self, parent, child):
+        """ Remove child from the neighbors of parent. A child left
+        without parents is removed from the graph """
+        parent.neighbors.remove(child)
+        if self.parentIndex is not None:
+            self.parentIndex[child].discard(parent)
+        self.inDegree[child] -= 1
+        if self.inDegree[child] == 0:
+            self.removeNode(child)
+
+    def redirect(self, parent, old, new):
+        """ Point parent at new instead of old """
+        # Link first, so a node shared by old and new keeps its parent
+        self.link(parent, new)
+        self.unlink(parent, old)
+
+    def removeNode(self, node):
+        """ Remove a node without parents from the graph, along with the
+        descendants that are left without parents in turn """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            node.safe = False
+            del self.nodes[node.id]
+            del self.inDegree[node]
+            if self.parentIndex is not None:
+                self.parentIndex.pop(node, None)
+            for neighbor in node.neighbors:
+                if self.parentIndex is not None:
+                    self.parentIndex[neighbor].discard(node)
+                self.inDegree[neighbor] -= 1
+                if self.inDegree[neighbor] == 0:
+                    stack.append(neighbor)
+
+    def reindex(self):
+        """ Rebuild in-degrees and roots from the neighbor sets, after
+        the neighbor sets were replaced wholesale """
+        self.inDegree = dict.fromkeys(self.nodes.values(), 0)
+        for nodeObj in self.nodes.values():
+            for neighbor in nodeObj.neighbors:
+                self.inDegree[neighbor] += 1
+        self.rootNodes = {
+            nodeObj for nodeObj, degree in self.inDegree.items()
+            if degree == 0}
 
     def getNodes(self):
         """ Function to get all the nodes of the graph.
         returns a JSON style list of dicts with node data """
-        result = []
-        for nodeId, nodeObj in self.nodes.items():
-            # Cast object to dict, exclude 'safe' attrib
-            temp = {
-                key: value
-                for key, value in nodeObj.__dict__.items()
-                if key is not 'safe'}
-            # Convert neighbor node objects to ids
-            temp['neighbors'] = [neighbor.id for neighbor in nodeObj.neighbors]
-            result.append(temp)
-        return result
+        with self.phase('serialize'):
+            return list(self.iterNodes())
+
+    def getNodesColumnar(self):
+        """ Function to get all the nodes of the graph as parallel lists,
+        without building a dict per node. The neighbors of ids[i] are
+        neighbors[offsets[i]:offsets[i + 1]].
+        returns a dict of ids, values, offsets and neighbor ids """
+        with self.phase('serialize'):
+            ids = []
+            values = []
+            offsets = [0]
+            neighbors = []
+            for nodeObj in self.nodes.values():
+                ids.append(nodeObj.id)
+                values.append(nodeObj.value)
+                neighbors.extend(neighbor.id for neighbor in nodeObj.neighbors)
+                offsets.append(len(neighbors))
+        return {
+            'ids': ids,
+            'values': values,
+            'offsets': offsets,
+            'neighbors': neighbors
+        }
+
+    def iterNodes(self):
+        """ Generator over all the nodes of the graph, yielding the
+        same dicts as getNodes one at a time """
+        for nodeObj in self.nodes.values():
+            yield nodeObj.serialize()
+
+    def freeze(self):
+        """ Return an immutable copy of the graph as it is now, whose
+        edits and merges share unchanged nodes with it.
+        returns a PersistentGraph, see graphius.persistent """
+        from graphius.persistent import PersistentGraph
+        return PersistentGraph.fromRecords(self.iterNodes())
 
     def roots(self):
         """ Return a set of root nodes of the graph """
-        return {
-                nodeObj for nodeId, nodeObj
-                in self.nodes.items()
-                if nodeId not in self.childNodes}
+        return set(self.rootNodes)
 
     def clean(self):
-        """ Method to get rid of any nodes that are no longer part of graph """
-        for nodeId in list(self.nodes.keys()):
-            if not self.nodes[nodeId].safe:
-                del self.nodes[nodeId]
+        """ Method to get rid of any nodes that are no longer part of graph.
+        Merges remove dead nodes as they go, so this only finds nodes
+        marked by hand, or by markMerged. Edges into removed nodes are
+        dropped, and their children stay, as roots if left without parents """
+        with self.phase('clean'):
+            dead = {
+                nodeObj for nodeObj in self.nodes.values()
+                if not nodeObj.safe}
+            self.count('removed', len(dead))
+            if not dead:
+                return
+            for nodeObj in dead:
+                del self.nodes[nodeObj.id]
+            for nodeObj in self.nodes.values():
+                if not nodeObj.neighbors.isdisjoint(dead):
+                    nodeObj.neighbors -= dead
+            self.reindex()
+            if self.parentIndex is not None:
+                self.buildParentIndex()
 
     def postOrderMerge(self):
-        """ Funciton to merge subtrees using helper below """
-
-        seen = {}
-        roots = self.roots()
-
-        # Run the merge starting at each root. Note that seen
-        # is presisted throughout.
-        for root in roots:
-            self.postOrderMergeHelper(root, seen)
+        """ Funciton to merge subtrees using helper below. Roots and
+        neighbors are visited in decreasing id order """
+
+        seen = EquivalenceIndex()
+        memo = {}
+        with self.phase('roots'):
+            roots = self.roots()
+
+        # Run the merge starting at each root. Note that seen and memo
+        # are presisted throughout. Replaced nodes are removed as soon
+        # as their last parent is redirected, so no sweep is needed after
+        before = len(self.nodes)
+        with self.phase('merge'):
+            for root in byId(roots):
+                if self.iterative:
+                    self.postOrderMergeHelperIterative(root, seen, memo)
+                else:
+                    self.postOrderMergeHelper(root, seen, memo)
+        self.count('visited', len(memo))
+        self.count('lookups', seen.hits + seen.misses)
+        self.count('hits', seen.hits)
+        self.count('merged', seen.hits)
+        self.count('removed', before - len(self.nodes))
+        self.equivalenceIndex = seen
+        self.parentIndex = None
+
+    def buildParentIndex(self):
+        """ Fill in the parent index from the neighbor sets """
+        self.parentIndex = {nodeObj: set() for nodeObj in self.nodes.values()}
+        for nodeObj in self.nodes.values():
+            for neighbor in nodeObj.neighbors:
+                self.parentIndex[neighbor].add(nodeObj)
+
+    def update(self, data=(), edges=()):
+        """ Add nodes and edges to a merged graph, then merge again only
+        the nodes that changed and their ancestors.
+        data:
+            node records, as given to parse. Children may be new or
+            existing nodes
+        edges:
+            (parent id, child id) pairs between new or existing nodes
+        """
+        if self.equivalenceIndex is None:
+            self.postOrderMerge()
+        if self.parentIndex is None:
+            self.buildParentIndex()
+        seen = self.equivalenceIndex
+
+        # Roots are kept by merges even when they match another node, so
+        # a root that gains a parent has to be resolved again
+        self.promoted = []
+        try:
+            dirty = self.parse(data)
+            for parentId, childId in edges:
+                parent, child = self.nodes[parentId], self.nodes[childId]
+                if child not in parent.neighbors:
+                    # Drop the index entry under the old neighbors first
+                    seen.discard(parent)
+                    self.link(parent, child)
+                    dirty.append(parent)
+            dirty.extend(self.promoted)
+        finally:
+            self.promoted = None
+
+        self.remerge(dirty)
+
+    def remerge(self, dirty):
+        """ Given a list of nodes whose neighbors changed, resolve them
+        again, children first. A node found equivalent to another is
+        replaced in all its parents, which are then resolved in turn.
+        Nodes whose subtrees did not change are never visited """
+        seen = self.equivalenceIndex
+        queue = deque(self.postOrder(dirty))
+        queued = set(queue)
+        while queue:
+            node = queue.popleft()
+            queued.discard(node)
+            if self.nodes.get(node.id) is not node:
+                continue  # Already replaced
+            resolved = self.getEquivNode(node, seen)
+            if resolved is node or node in self.rootNodes:
+                # Roots are kept, as in postOrderMerge
+                continue
+
+            # The node is removed once its last parent is redirected
+            for parent in byId(self.parentIndex[node]):
+                seen.discard(parent)
+                self.redirect(parent, node, resolved)
+                if parent not in queued:
+                    queued.add(parent)
+                    queue.append(parent)
+
+    def postOrder(self, nodes):
+        """ Given a list of nodes, return them ordered so that every node
+        comes after those of its descendants that are also in the list """
+        wanted = set(nodes)
+        visited = set()
+        result = []
+        for start in nodes:
+            if start in visited:
+                continue
+            visited.add(start)
+            stack = [(start, iter(byId(start.neighbors)))]
+            while stack:
+                node, neighbors = stack[-1]
+                for neighbor in neighbors:
+                    if neighbor in wanted and neighbor not in visited:
+                        visited.add(neighbor)
+                        stack.append(
+                            (neighbor, iter(byId(neighbor.neighbors))))
+                        break
+                else:
+                    stack.pop()
+                    result.append(node)
+        return result
 
-        # Clean out any dead nodes
-        self.clean()
+    def equivalenceStats(self):
+        """ Return the lookup counts of the last postOrderMerge """
+        if self.equivalenceIndex is None:
+            return EquivalenceIndex().stats()
+        return self.equivalenceIndex.stats()
 
-    def postOrderMergeHelper(self, root, seen):
-        """ Given a root node and a dict of seen nodes,
+    def postOrderMergeHelper(self, root, seen, memo=None):
+        """ Given a root node and an EquivalenceIndex of seen nodes,
         recursively traverse all children.
         If a recursive call returns a different child,
         update that reference in the nieghbors set.
         Finally, if another node that is equiv (same value and neigbhors)
-        as root has been seen, update the seen dict
+        as root has been seen, return it. Otherwise add root to seen
+        memo:
+            a dict of already resolved nodes, indexed by node. Subtrees
+            shared by several parents are only traversed once
         """
+        if memo is None:
+            memo = {}
+        if root in memo:
+            return memo[root]
 
         # Check if each neighbor is collapsible
-        for neighbor in list(root.neighbors):
-            resolvedNeighbor = self.postOrderMergeHelper(neighbor, seen)
+        for neighbor in byId(root.neighbors):
+            resolvedNeighbor = self.postOrderMergeHelper(neighbor, seen, memo)
 
             if neighbor != resolvedNeighbor:
                 # print("Updating {}s neighbor ref from {} to {}".format(
@@ -95,32 +449,67 @@ class Graphius(object):
                 #     neighbor.id,
                 #     resolvedNeighbor.id
                 # ))
-                root.neighbors.remove(neighbor)
-                root.neighbors.add(resolvedNeighbor)
-                # Mark the old node
-                neighbor.safe = False
+                # The old node is removed with its last parent reference
+                self.redirect(root, neighbor, resolvedNeighbor)
 
         # Base case, no children
 
         resolved = self.getEquivNode(root, seen)
         # The above call either gets the same node, or another node with same
         # val and identical children
-
-        # Update the ref in seen
-        seen[resolved.value] = resolved
+        memo[root] = resolved
         return resolved
 
+    def postOrderMergeHelperIterative(self, root, seen, memo=None):
+        """ Same as postOrderMergeHelper, using an explicit stack.
+        Each frame holds a node, an iterator over its neighbors and the
+        neighbor currently being resolved. Raises ValueError on a cycle """
+        if memo is None:
+            memo = {}
+        if root in memo:
+            return memo[root]
+
+        stack = [[root, iter(byId(root.neighbors)), None]]
+        active = {root}  # Nodes on the current path
+        while True:
+            frame = stack[-1]
+            neighbor = next(frame[1], None)
+            if neighbor is None:
+                # All neighbors of this node are resolved
+                node = stack.pop()[0]
+                active.discard(node)
+                resolved = self.getEquivNode(node, seen)
+                memo[node] = resolved
+                if not stack:
+                    return resolved
+                frame = stack[-1]
+                neighbor = frame[2]
+            elif neighbor in memo:
+                # Shared subtree, already resolved from another parent
+                resolved = memo[neighbor]
+            elif neighbor in active:
+                raise ValueError(
+                    "Cycle detected at node {}".format(neighbor.id))
+            else:
+                # Descend into the next neighbor
+                active.add(neighbor)
+                frame[2] = neighbor
+                stack.append([neighbor, iter(byId(neighbor.neighbors)), None])
+                continue
+
+            parent = frame[0]
+            if neighbor != resolved:
+                # The old node is removed with its last parent reference
+                self.redirect(parent, neighbor, resolved)
+
     def getEquivNode(self, root, seen):
         """
-        Given a root node, and a dict of nodes,
-        indexed by value
-        If another node with this root's has been seen,
-        and it is identical to root (Same neighbors), return it.
-        Otherwise, return root """
-
-        if root.value in seen and seen[root.value].neighbors == root.neighbors:
-            return seen[root.value]
-        return root
+        Given a root node, and an EquivalenceIndex of nodes,
+        indexed by value and neighbors
+        If another node with this root's value and identical neighbors
+        has been seen, return it.
+        Otherwise, add root to the index and return root """
+        return seen.resolve(root)
 
     def isSameTree(self, node1, node2):
         """
@@ -172,8 +561,139 @@ class Graphius(object):
 
         return collapsable
 
-    def merge(self):
-        """ Function to merge all same subtrees in graph """
+    def signatures(self):
+        """ Assign every node a canonical signature, built bottom up from
+        its value and the signatures of its children. Two nodes share a
+        signature exactly when they root identical subtrees.
+        returns a dict of integer class ids, indexed by node id """
+
+        table = {}  # (value, frozenset of child class ids) -> class id
+        classes = {}  # Class ids, indexed by node id
+
+        for start in self.nodes.values():
+            if start.id in classes:
+                continue
+
+            # Iterative post order walk, so children are always
+            # classified before their parents
+            stack = [(start, iter(start.neighbors))]
+            active = {start.id}
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if child.id in classes:
+                        continue
+                    if child.id in active:
+                        raise ValueError(
+                            "Cycle detected at node {}".format(child.id))
+                    active.add(child.id)
+                    stack.append((child, iter(child.neighbors)))
+                    break
+                else:
+                    stack.pop()
+                    active.discard(node.id)
+                    key = (
+                        node.value,
+                        frozenset(classes[n.id] for n in node.neighbors))
+                    classes[node.id] = table.setdefault(key, len(table))
+
+        return classes
+
+    def query(self):
+        """ Index the identical subtrees of the graph as it is now, so
+        canonicalOf, isSameTree and equivalenceClass can be asked by id
+        in O(1), before or after merging.
+        returns an EquivalenceQuery """
+        return EquivalenceQuery(self)
+
+    def duplicateReport(self, top=10):
+        """ Report the repeated subtrees of the graph, largest savings
+        first, without merging. See graphius.report.duplicateReport """
+        return duplicateReport(self, top)
+
+    def planMerge(self, engine='hashcons'):
+        """ Work out a merge without doing it. The graph is left as is.
+        engine:
+            'hashcons' groups nodes on signatures, 'bisimulation' by
+            partition refinement, which also accepts cycles
+        returns a dict of canonical ids, indexed by node id. As with
+        merge, the largest id of each group is canonical """
+        if engine == 'hashcons':
+            return canonicalIds(self.signatures())
+        if engine == 'bisimulation':
+            return canonicalIds(self.bisimulationSignatures())
+        raise ValueError("Unknown plan engine: {}".format(engine))
+
+    def applyPlan(self, plan):
+        """ Merge the graph as planned by planMerge: nodes mapped to
+        another id are dropped, and every neighbor is replaced by its
+        canonical node. Ids missing from the plan map to themselves """
+        self.equivalenceIndex = None
+        self.parentIndex = None
+        classes = {nodeId: plan.get(nodeId, nodeId) for nodeId in self.nodes}
+        self.collapse(classes, {key: key for key in set(classes.values())})
+        self.reindex()
+
+    def merge(self, engine='bruteforce', workers=None, cache=None,
+              keepRoots=False):
+        """ Function to merge all same subtrees in graph
+        engine:
+            'bruteforce' compares every pair of nodes with isSameTree,
+            'hashcons' groups nodes by signature in O(n + e),
+            'parallel' hashes weakly connected components in a pool of
+            worker processes, then groups nodes across components,
+            'vectorized' assigns classes one height level at a time
+            with NumPy, which must be installed,
+            'bisimulation' refines a partition of the nodes until it is
+            stable, and also merges graphs with cycles
+        workers:
+            number of worker processes for 'parallel', defaults to the
+            number of CPUs
+        cache:
+            a SignatureCache, for the 'hashcons' and 'parallel' engines.
+            Nodes are then grouped on content digests, and a group keeps
+            the canonical id an earlier run kept, when it is present
+        keepRoots:
+            keep roots that duplicate another subtree, as postOrderMerge
+            does. Not available with the 'bruteforce' engine """
+        if engine not in self.engines:
+            raise ValueError("Unknown merge engine: {}".format(engine))
+        if cache is not None and engine not in ('hashcons', 'parallel'):
+            raise ValueError(
+                "The signature cache needs the hashcons or parallel engine")
+        if keepRoots and engine == 'bruteforce':
+            raise ValueError("The bruteforce engine can not keep roots")
+        self.equivalenceIndex = None
+        self.parentIndex = None
+        before = len(self.nodes)
+        keep = self.roots() if keepRoots else None
+        with self.phase('merge'):
+            if cache is not None:
+                self.cachedMerge(cache, engine, workers, keep)
+            else:
+                self.mergeEngine(engine, workers, keep)
+            # Engines replace neighbor sets wholesale
+            self.reindex()
+        # Every node is looked up once, and hits are the nodes dropped
+        self.count('visited', before)
+        self.count('lookups', before)
+        self.count('hits', before - len(self.nodes))
+        self.count('merged', before - len(self.nodes))
+        self.count('removed', before - len(self.nodes))
+
+    def mergeEngine(self, engine, workers=None, keep=None):
+        """ Run one merge engine, as chosen by merge.
+        keep:
+            a set of nodes to keep even when they duplicate another """
+        if engine == 'hashcons':
+            return self.hashconsMerge(keep)
+        if engine == 'parallel':
+            return self.parallelMerge(workers, keep)
+        if engine == 'vectorized':
+            return self.vectorizedMerge(keep)
+        if engine == 'bisimulation':
+            return self.bisimulationMerge(keep)
+
         collapsable = self.findSameSubtrees()
 
         dummy = GraphiusNode(-1, None)
@@ -181,17 +701,160 @@ class Graphius(object):
             dummy.addNeighbor(node)
 
         # Perform the merge
-        self.mergeHelper(dummy, collapsable)
+        if self.iterative:
+            self.mergeHelperIterative(dummy, collapsable)
+        else:
+            self.mergeHelper(dummy, collapsable)
 
         # Regenerate trees
         newNodes = self.dfs(dummy)
         assert(-1 not in newNodes)
         self.nodes = newNodes
 
+    def hashconsMerge(self, keep=None):
+        """ Merge all same subtrees by grouping nodes on their signature.
+        Like merge, the node with the largest id in each group is kept """
+        self.collapse(self.signatures(), keep=keep)
+
+    def parallelMerge(self, workers=None, keep=None):
+        """ Merge all same subtrees by grouping nodes on subtree digests,
+        computed for independent components in worker processes """
+        from graphius.parallel import parallelDigests
+        self.collapse(parallelDigests(self, workers), keep=keep)
+
+    def cachedMerge(self, cache, engine='hashcons', workers=None, keep=None):
+        """ Merge all same subtrees by grouping nodes on content digests,
+        keeping the canonical ids cached for known digests, and caching
+        the ids kept for new ones. With the hashcons engine, every
+        distinct subtree is digested and looked up once, however often
+        it repeats """
+        if engine == 'parallel':
+            from graphius.parallel import parallelDigests
+            classes = parallelDigests(self, workers)
+            digests = {digest: digest for digest in set(classes.values())}
+        else:
+            classes = self.signatures()
+            digests = self.classDigests(classes)
+        known = cache.lookup(set(digests.values()))
+        preferred = {
+            key: known[digest] for key, digest in digests.items()
+            if digest in known}
+        canonical = self.collapse(classes, preferred, keep)
+        cache.store({
+            digests[key]: nodeObj.id for key, nodeObj in canonical.items()
+            if preferred.get(key) != nodeObj.id})
+        if self.stats is not None:
+            self.stats['cache'] = cache.stats()
+
+    def classDigests(self, classes):
+        """ Given the class ids of signatures, return the same subtree
+        digests as recordDigests, computed once per class rather than
+        once per node.
+        returns a dict of digests, indexed by class id """
+        # A node of every class. Class ids are handed out children first
+        members = {}
+        for nodeId, classId in classes.items():
+            if classId not in members:
+                members[classId] = self.nodes[nodeId]
+        encodings = {}  # Encoded values, indexed by value
+        digests = {}
+        for classId in range(len(members)):
+            nodeObj = members[classId]
+            encoded = encodings.get(nodeObj.value)
+            if encoded is None:
+                encoded = encodings[nodeObj.value] = encodeValue(
+                    nodeObj.value)
+            digests[classId] = nodeDigest(
+                nodeObj.value,
+                [digests[classes[n.id]] for n in nodeObj.neighbors],
+                encoded)
+        return digests
+
+    def vectorizedMerge(self, keep=None):
+        """ Merge all same subtrees, with classes assigned by NumPy over
+        a flat copy of the graph """
+        nodes, codes, offsets, children = self.flatten()
+        classes = levelClasses(codes, offsets, children)
+        self.collapse(
+            dict(zip((node.id for node in nodes), classes.tolist())),
+            keep=keep)
+
+    def bisimulationMerge(self, keep=None):
+        """ Merge all nodes with the same value and equivalent children,
+        by partition refinement over a flat copy of the graph. Unlike
+        the other engines, it accepts cycles """
+        self.collapse(self.bisimulationSignatures(), keep=keep)
+
+    def bisimulationSignatures(self):
+        """ Assign every node a block of the coarsest stable partition,
+        see graphius.bisimulation.
+        returns a dict of integer block ids, indexed by node id """
+        nodes, codes, offsets, children = self.flatten()
+        classes = bisimulationClasses(codes, offsets, children)
+        return dict(zip((node.id for node in nodes), classes))
+
+    def flatten(self):
+        """ Return the graph as flat lists: the nodes, their value codes,
+        and CSR offsets and child positions. The children of nodes[i]
+        are children[offsets[i]:offsets[i + 1]] """
+        nodes = list(self.nodes.values())
+        position = {node: i for i, node in enumerate(nodes)}
+        valueCodes = {}
+        codes = []
+        offsets = [0]
+        children = []
+        for node in nodes:
+            codes.append(valueCodes.setdefault(node.value, len(valueCodes)))
+            children.extend(position[neighbor] for neighbor in node.neighbors)
+            offsets.append(len(children))
+        return nodes, codes, offsets, children
+
+    def collapse(self, classes, preferred=None, keep=None):
+        """ Given a dict of class keys indexed by node id, where nodes
+        share a key exactly when they root identical subtrees, keep the
+        node with the largest id of each class and drop the others.
+        preferred:
+            a dict of node ids indexed by class key. These nodes are
+            kept instead, when they are in the graph and in that class
+        keep:
+            a set of nodes kept as well, such as roots. Their neighbors
+            are pointed at the kept nodes like any other
+        returns a dict of the kept nodes, indexed by class key """
+        keep = keep or set()
+
+        # Pick a representative node for every signature
+        canonical = {}
+        for nodeId, nodeObj in self.nodes.items():
+            rep = canonical.get(classes[nodeId])
+            if rep is None or nodeId > rep.id:
+                canonical[classes[nodeId]] = nodeObj
+        for key, nodeId in (preferred or {}).items():
+            nodeObj = self.nodes.get(nodeId)
+            if nodeObj is not None and classes[nodeId] == key:
+                canonical[key] = nodeObj
+
+        # Point representatives at representative children only
+        for nodeObj in keep.union(canonical.values()):
+            nodeObj.neighbors = {
+                canonical[classes[neighbor.id]]
+                for neighbor in nodeObj.neighbors}
+
+        newNodes = {}
+        for nodeId, nodeObj in self.nodes.items():
+            if canonical[classes[nodeId]] is nodeObj or nodeObj in keep:
+                newNodes[nodeId] = nodeObj
+            else:
+                nodeObj.safe = False
+        self.nodes = newNodes
+        return canonical
+
     def dfs(self, root):
         """ Outer function for dfs """
         result = {}
-        self.dfsHelper(root, result)
+        if self.iterative:
+            self.dfsHelperIterative(root, result)
+        else:
+            self.dfsHelper(root, result)
         return result
 
     def dfsHelper(self, root, nodes):
@@ -203,6 +866,20 @@ class Graphius(object):
         for neighbor in root.neighbors:
             self.dfsHelper(neighbor, nodes)
 
+    def dfsHelperIterative(self, root, nodes):
+        """ Same as dfsHelper, using an explicit stack. Shared
+        subtrees are only walked once """
+        visited = {root}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node.id > 0:
+                nodes[node.id] = node
+            for neighbor in node.neighbors:
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    stack.append(neighbor)
+
     def mergeHelper(self, root, collapsable):
         """ Helper function for merges.
         Given a root, and a list of collapsable subtrees, for each neighbor
@@ -236,3 +913,32 @@ class Graphius(object):
         for neighbor in root.neighbors:
             self.markMerged(neighbor)
         return  # Base case will skip loop and jump here (leaf node)
+
+    def mergeHelperIterative(self, root, collapsable):
+        """ Same as mergeHelper, using an explicit stack. Every
+        uncollapsed node has its neighbor references updated once """
+        visited = {root}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for neighbor in list(node.neighbors):
+                if neighbor in collapsable:
+                    # Mark first, as in mergeHelper
+                    self.markMergedIterative(neighbor)
+                    node.neighbors.remove(neighbor)
+                    node.neighbors.add(collapsable[neighbor])
+                elif neighbor not in visited:
+                    visited.add(neighbor)
+                    stack.append(neighbor)
+
+    def markMergedIterative(self, root):
+        """ Same as markMerged, using an explicit stack """
+        visited = {root}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            node.safe = False
+            for neighbor in node.neighbors:
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    stack.append(neighbor)
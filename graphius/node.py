@@ -1,12 +1,30 @@
+from sys import intern
+
+
 class GraphiusNode(object):
     """An object representing a Node """
+    __slots__ = ('id', 'value', 'neighbors', 'safe')
+
+    # Set to True to type check the node passed to every addNeighbor call
+    validate = False
+
     def __init__(self, id, value):
         self.id = id
-        self.value = value
+        # Share one copy of repeated string values
+        self.value = intern(value) if type(value) is str else value
         self.neighbors = set()  # A set of other node ids, which are edges
         self.safe = True  # Flag to be used in deletion
 
     def addNeighbor(self, node):
         """ Given another node, add it as a neighbor """
-        assert(type(node) == GraphiusNode)  # Type checking
+        if self.validate:
+            assert(type(node) == GraphiusNode)  # Type checking
         self.neighbors.add(node)
+
+    def serialize(self):
+        """ Return a JSON style dict of the node, with neighbor ids """
+        return {
+            'id': self.id,
+            'value': self.value,
+            'neighbors': [neighbor.id for neighbor in self.neighbors]
+        }
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from graphius.digest import recordDigests
+
+# Batches handed out per worker, so uneven batches still balance
+BATCHES_PER_WORKER = 4
+
+
+def components(graph):
+    """ Given a Graphius, return its weakly connected components,
+    as lists of GraphiusNode objects """
+    parent = {nodeId: nodeId for nodeId in graph.nodes}
+
+    def find(nodeId):
+        # Union find, with path halving
+        while parent[nodeId] != nodeId:
+            parent[nodeId] = parent[parent[nodeId]]
+            nodeId = parent[nodeId]
+        return nodeId
+
+    for nodeObj in graph.nodes.values():
+        for neighbor in nodeObj.neighbors:
+            a, b = find(nodeObj.id), find(neighbor.id)
+            if a != b:
+                parent[a] = b
+
+    result = {}
+    for nodeId, nodeObj in graph.nodes.items():
+        result.setdefault(find(nodeId), []).append(nodeObj)
+    return list(result.values())
+
+
+def encode(nodes):
+    """ Given a list of nodes, return a picklable list of
+    (id, value, child ids) tuples """
+    return [
+        (node.id, node.value, [neighbor.id for neighbor in node.neighbors])
+        for node in nodes]
+
+
+def batches(parts, count):
+    """ Given a list of components, group them into about count
+    batches of similar node counts. returns a list of encoded batches """
+    target = max(1, sum(len(part) for part in parts) // count)
+    result = []
+    batch = []
+    for part in sorted(parts, key=len, reverse=True):
+        batch.extend(encode(part))
+        if len(batch) >= target:
+            result.append(batch)
+            batch = []
+    if batch:
+        result.append(batch)
+    return result
+
+
+def parallelDigests(graph, workers=None):
+    """ Given a Graphius, compute the subtree digest of every node,
+    one batch of whole components per task in a process pool.
+    returns a dict of digests, indexed by node id """
+    workers = workers or os.cpu_count() or 1
+    work = batches(components(graph), workers * BATCHES_PER_WORKER)
+
+    digests = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(recordDigests, work):
+            digests.update(result)
+    return digests
@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+"""
+    Immutable graph versions that share structure. Nodes are FrozenNodes,
+    whose neighbors are a frozenset of child ids, and a version maps ids
+    to nodes with a PersistentMap, a hash array mapped trie. An edit or a
+    merge returns a new version that copies only the changed nodes and
+    the trie paths leading to them, O(log n) trie nodes each, and shares
+    everything else with the version it came from. Keeping N versions of
+    a mostly identical graph costs one graph plus the differences.
+"""
+from collections import namedtuple
+from sys import intern
+
+from graphius.graphius import Graphius
+from graphius.plan import canonicalIds
+
+# Hash bits consumed per trie level
+BITS = 5
+MASK = (1 << BITS) - 1
+
+# Hash bits used in total. Keys whose hashes agree on all of them share
+# a collision node, a plain tuple of pairs
+HASH_BITS = 64
+
+
+def keyHash(key):
+    """ Return the hash of key as a non negative integer """
+    return hash(key) & ((1 << HASH_BITS) - 1)
+
+
+class TrieNode(object):
+    """
+        A node of a PersistentMap, never changed once built.
+        bitmap:
+            bit b is set when the slot for hash bits b at this level is
+            taken. Zero in collision nodes
+        entries:
+            a tuple with one entry per set bit, in bit order. An entry is
+            either a TrieNode or a (key, value) pair
+    """
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+EMPTY = TrieNode(0, ())
+
+
+def slot(bitmap, bit):
+    """ Return the position in entries of the entry for bit """
+    return bin(bitmap & (bit - 1)).count('1')
+
+
+def trieGet(node, key, h):
+    """ Return the value of key in the trie rooted at node """
+    shift = 0
+    while shift < HASH_BITS:
+        bit = 1 << ((h >> shift) & MASK)
+        if not node.bitmap & bit:
+            raise KeyError(key)
+        entry = node.entries[slot(node.bitmap, bit)]
+        if type(entry) is not TrieNode:
+            if entry[0] == key:
+                return entry[1]
+            raise KeyError(key)
+        node = entry
+        shift += BITS
+    for k, v in node.entries:
+        if k == key:
+            return v
+    raise KeyError(key)
+
+
+def trieJoin(pair1, h1, pair2, h2, shift):
+    """ Return a trie node holding two pairs with different keys """
+    if shift >= HASH_BITS:
+        return TrieNode(0, (pair1, pair2))
+    b1 = (h1 >> shift) & MASK
+    b2 = (h2 >> shift) & MASK
+    if b1 == b2:
+        return TrieNode(
+            1 << b1, (trieJoin(pair1, h1, pair2, h2, shift + BITS),))
+    if b1 > b2:
+        pair1, pair2 = pair2, pair1
+    return TrieNode((1 << b1) | (1 << b2), (pair1, pair2))
+
+
+def trieSet(node, key, value, h, shift):
+    """ Return a copy of the trie rooted at node with key set to value,
+    sharing all untouched nodes, and whether key is new """
+    if shift >= HASH_BITS:
+        entries = tuple(pair for pair in node.entries if pair[0] != key)
+        added = len(entries) == len(node.entries)
+        return TrieNode(0, entries + ((key, value),)), added
+
+    bit = 1 << ((h >> shift) & MASK)
+    i = slot(node.bitmap, bit)
+    entries = node.entries
+    if not node.bitmap & bit:
+        return TrieNode(
+            node.bitmap | bit, entries[:i] + ((key, value),) + entries[i:]
+        ), True
+
+    entry = entries[i]
+    added = False
+    if type(entry) is TrieNode:
+        entry, added = trieSet(entry, key, value, h, shift + BITS)
+        if entry is entries[i]:
+            return node, False
+    elif entry[0] == key:
+        if entry[1] is value:
+            return node, False
+        entry = (key, value)
+    else:
+        entry = trieJoin(
+            entry, keyHash(entry[0]), (key, value), h, shift + BITS)
+        added = True
+    return TrieNode(
+        node.bitmap, entries[:i] + (entry,) + entries[i + 1:]), added
+
+
+def trieDelete(node, key, h, shift):
+    """ Return a copy of the trie rooted at node without key, or None if
+    it would be empty. Raises KeyError if key is missing """
+    if shift >= HASH_BITS:
+        entries = tuple(pair for pair in node.entries if pair[0] != key)
+        if len(entries) == len(node.entries):
+            raise KeyError(key)
+        return TrieNode(0, entries) if entries else None
+
+    bit = 1 << ((h >> shift) & MASK)
+    if not node.bitmap & bit:
+        raise KeyError(key)
+    i = slot(node.bitmap, bit)
+    entries = node.entries
+    entry = entries[i]
+    if type(entry) is TrieNode:
+        entry = trieDelete(entry, key, h, shift + BITS)
+        if entry is not None:
+            # A lone pair moves up to take the place of its node
+            if len(entry.entries) == 1 and \
+                    type(entry.entries[0]) is not TrieNode:
+                entry = entry.entries[0]
+            return TrieNode(
+                node.bitmap, entries[:i] + (entry,) + entries[i + 1:])
+    elif entry[0] != key:
+        raise KeyError(key)
+
+    if node.bitmap == bit:
+        return None
+    return TrieNode(node.bitmap & ~bit, entries[:i] + entries[i + 1:])
+
+
+def trieBuild(items, shift):
+    """ Build a trie from a list of (hash, key, value) with distinct keys
+    in one pass, without the intermediate copies of repeated sets """
+    if shift >= HASH_BITS:
+        return TrieNode(0, tuple((k, v) for h, k, v in items))
+    buckets = {}
+    for item in items:
+        buckets.setdefault((item[0] >> shift) & MASK, []).append(item)
+    bitmap = 0
+    entries = []
+    for b in sorted(buckets):
+        bitmap |= 1 << b
+        group = buckets[b]
+        if len(group) == 1:
+            entries.append((group[0][1], group[0][2]))
+        else:
+            entries.append(trieBuild(group, shift + BITS))
+    return TrieNode(bitmap, tuple(entries))
+
+
+class PersistentMap(object):
+    """
+        An immutable dictionary. set and delete return a new map sharing
+        all but O(log n) trie nodes with the old one, which is unchanged.
+        root:
+            the TrieNode holding the pairs
+        size:
+            the number of keys
+    """
+    __slots__ = ('root', 'size')
+
+    def __init__(self, root=EMPTY, size=0):
+        self.root = root
+        self.size = size
+
+    @classmethod
+    def fromItems(cls, items):
+        """ Build a map from an iterable of (key, value) pairs. Later
+        pairs win over earlier ones with the same key """
+        items = dict(items)
+        if not items:
+            return cls()
+        return cls(
+            trieBuild([(keyHash(k), k, v) for k, v in items.items()], 0),
+            len(items))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        return trieGet(self.root, key, keyHash(key))
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for key, value in self.items():
+            yield key
+
+    def get(self, key, default=None):
+        """ Return the value of key, or default if it is missing """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        """ Generator over the (key, value) pairs, in no fixed order """
+        stack = [self.root]
+        while stack:
+            for entry in stack.pop().entries:
+                if type(entry) is TrieNode:
+                    stack.append(entry)
+                else:
+                    yield entry
+
+    def values(self):
+        """ Generator over the values, in no fixed order """
+        for key, value in self.items():
+            yield value
+
+    def set(self, key, value):
+        """ Return a new map with key set to value """
+        root, added = trieSet(self.root, key, value, keyHash(key), 0)
+        if root is self.root:
+            return self
+        return PersistentMap(root, self.size + added)
+
+    def delete(self, key):
+        """ Return a new map without key. Raises KeyError if missing """
+        root = trieDelete(self.root, key, keyHash(key), 0)
+        return PersistentMap(root or EMPTY, self.size - 1)
+
+
+class FrozenNode(namedtuple('FrozenNode', ('id', 'value', 'neighbors'))):
+    """ An immutable node. neighbors is a frozenset of child ids rather
+    than nodes, so a node is never copied because a child changed """
+    __slots__ = ()
+
+    def __new__(cls, id, value, neighbors=frozenset()):
+        # Share one copy of repeated string values, as GraphiusNode does
+        value = intern(value) if type(value) is str else value
+        return super(FrozenNode, cls).__new__(
+            cls, id, value, frozenset(neighbors))
+
+    def serialize(self):
+        """ Return a JSON style dict of the node, as GraphiusNode does """
+        return {
+            'id': self.id,
+            'value': self.value,
+            'neighbors': list(self.neighbors)
+        }
+
+
+class PersistentGraph(object):
+    """
+        An immutable version of a graph. Every edit returns a new version,
+        leaving this one as it was.
+        nodes:
+            a PersistentMap of FrozenNodes, indexed by node id
+    """
+    def __init__(self, nodes=None):
+        self.nodes = PersistentMap() if nodes is None else nodes
+
+    @classmethod
+    def fromRecords(cls, records):
+        """ Build a version from node records, either as read by parse,
+        with 'children', or as written by getNodes, with 'neighbors'.
+        Raises KeyError on a child id without a record """
+        nodes = PersistentMap.fromItems(
+            (record['id'], FrozenNode(
+                record['id'], record['value'],
+                record['children'] if 'children' in record
+                else record['neighbors']))
+            for record in records)
+        for node in nodes.values():
+            for child in node.neighbors:
+                if child not in nodes:
+                    raise KeyError(child)
+        return cls(nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, nodeId):
+        return nodeId in self.nodes
+
+    def __getitem__(self, nodeId):
+        return self.nodes[nodeId]
+
+    def getNodes(self):
+        """ Function to get all the nodes of the graph.
+        returns a JSON style list of dicts with node data """
+        return list(self.iterNodes())
+
+    def iterNodes(self):
+        """ Generator over all the nodes of the graph, yielding the
+        same dicts as getNodes one at a time """
+        for node in self.nodes.values():
+            yield node.serialize()
+
+    def roots(self):
+        """ Return the set of ids of nodes without parents """
+        children = set()
+        for node in self.nodes.values():
+            children.update(node.neighbors)
+        return {nodeId for nodeId in self.nodes if nodeId not in children}
+
+    def thaw(self):
+        """ Return a mutable Graphius copy of this version """
+        return Graphius([
+            {'id': node.id, 'value': node.value,
+             'children': list(node.neighbors)}
+            for node in self.nodes.values()])
+
+    def replace(self, node):
+        """ Return a new version with node stored under its id """
+        return PersistentGraph(self.nodes.set(node.id, node))
+
+    def setValue(self, nodeId, value):
+        """ Return a new version with the value of a node changed """
+        node = self.nodes[nodeId]
+        return self.replace(FrozenNode(nodeId, value, node.neighbors))
+
+    def addNode(self, nodeId, value, children=()):
+        """ Return a new version with a node added. Raises ValueError if
+        the id is taken, KeyError if a child is missing """
+        if nodeId in self.nodes:
+            raise ValueError("Duplicate node id: {}".format(nodeId))
+        for child in children:
+            if child not in self.nodes:
+                raise KeyError(child)
+        return self.replace(FrozenNode(nodeId, value, children))
+
+    def addEdge(self, parentId, childId):
+        """ Return a new version with an edge from parent to child """
+        parent = self.nodes[parentId]
+        if childId not in self.nodes:
+            raise KeyError(childId)
+        if childId in parent.neighbors:
+            return self
+        return self.replace(FrozenNode(
+            parentId, parent.value, parent.neighbors | {childId}))
+
+    def removeEdge(self, parentId, childId):
+        """ Return a new version without the edge from parent to child.
+        The child stays, as a root if that was its only parent """
+        parent = self.nodes[parentId]
+        if childId not in parent.neighbors:
+            return self
+        return self.replace(FrozenNode(
+            parentId, parent.value, parent.neighbors - {childId}))
+
+    def removeNode(self, nodeId):
+        """ Return a new version without a node and the edges into it.
+        Finding its parents takes a walk over every node, but only the
+        parents are copied. Its children stay """
+        nodes = self.nodes.delete(nodeId)
+        for node in self.nodes.values():
+            if nodeId in node.neighbors:
+                nodes = nodes.set(node.id, FrozenNode(
+                    node.id, node.value, node.neighbors - {nodeId}))
+        return PersistentGraph(nodes)
+
+    def signatures(self):
+        """ Same as Graphius.signatures, over child ids.
+        returns a dict of integer class ids, indexed by node id """
+        table = {}  # (value, frozenset of child class ids) -> class id
+        classes = {}  # Class ids, indexed by node id
+        nodes = self.nodes
+
+        for start in nodes.values():
+            if start.id in classes:
+                continue
+
+            stack = [(start, iter(start.neighbors))]
+            active = {start.id}
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if child in classes:
+                        continue
+                    if child in active:
+                        raise ValueError(
+                            "Cycle detected at node {}".format(child))
+                    active.add(child)
+                    childNode = nodes[child]
+                    stack.append((childNode, iter(childNode.neighbors)))
+                    break
+                else:
+                    stack.pop()
+                    active.discard(node.id)
+                    key = (
+                        node.value,
+                        frozenset(classes[n] for n in node.neighbors))
+                    classes[node.id] = table.setdefault(key, len(table))
+
+        return classes
+
+    def planMerge(self):
+        """ Same as Graphius.planMerge with the hashcons engine.
+        returns a dict of canonical ids, indexed by node id """
+        return canonicalIds(self.signatures())
+
+    def applyPlan(self, plan):
+        """ Return a new version merged as planned: nodes mapped to another
+        id are dropped, and neighbors are replaced by their canonical
+        nodes. Nodes whose neighbors are all canonical are shared """
+        nodes = self.nodes
+        for node in self.nodes.values():
+            if plan.get(node.id, node.id) != node.id:
+                nodes = nodes.delete(node.id)
+            elif any(plan.get(child, child) != child
+                     for child in node.neighbors):
+                nodes = nodes.set(node.id, FrozenNode(
+                    node.id, node.value,
+                    (plan.get(child, child) for child in node.neighbors)))
+        return PersistentGraph(nodes)
+
+    def merge(self):
+        """ Return a new version with identical subtrees merged, keeping
+        the node with the largest id of each, as merge does """
+        return self.applyPlan(self.planMerge())
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+
+def canonicalIds(classes):
+    """ Given a dict of class keys indexed by node id, map every node id
+    to the largest id of its class, as the merge engines keep.
+    returns a dict of canonical ids, indexed by node id """
+    largest = {}
+    for nodeId, key in classes.items():
+        if key not in largest or nodeId > largest[key]:
+            largest[key] = nodeId
+    return {nodeId: largest[key] for nodeId, key in classes.items()}
+
+
+def applyPlan(records, plan):
+    """ Given an iterable of node records, either as read by parse, with
+    'children', or as written by getNodes, with 'neighbors', and a dict
+    of canonical ids indexed by node id, yield the records of the
+    merged graph. Records of replaced nodes are dropped, and child ids
+    are replaced by their canonical ids. Ids missing from the plan are
+    kept as they are """
+    for record in records:
+        nodeId = record['id']
+        if plan.get(nodeId, nodeId) != nodeId:
+            continue
+        key = 'children' if 'children' in record else 'neighbors'
+        children = []
+        seen = set()
+        for child in record[key]:
+            child = plan.get(child, child)
+            if child not in seen:
+                seen.add(child)
+                children.append(child)
+        merged = dict(record)
+        merged[key] = children
+        yield merged
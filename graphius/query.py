@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+
+class EquivalenceQuery(object):
+    """
+        An index of identical subtrees, built once from the signatures of
+        a graph, usually before merging it. Afterwards every query is a
+        dictionary lookup, and node ids from before the merge can still
+        be asked about.
+        graph:
+            the Graphius the index was built from. Nodes removed from it
+            later, by a merge or clean, are skipped over when picking
+            canonical nodes
+        classOf:
+            a dictionary of class ids, indexed by node id
+        members:
+            a dictionary of tuples of node ids, largest first, indexed by
+            class id
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.classOf = graph.signatures()
+        grouped = {}
+        for nodeId, classId in self.classOf.items():
+            grouped.setdefault(classId, []).append(nodeId)
+        self.members = {
+            classId: tuple(sorted(ids, reverse=True))
+            for classId, ids in grouped.items()}
+        # Position of the current canonical node in each members tuple
+        self.current = dict.fromkeys(self.members, 0)
+
+    def canonicalOf(self, nodeId):
+        """ Return the id of the node still in the graph that nodeId was
+        merged into, or nodeId itself if it is still there. Prefers the
+        largest id, as merge does. returns None if every node of the
+        class is gone """
+        classId = self.classOf[nodeId]
+        members = self.members[classId]
+        if nodeId in self.graph.nodes:
+            return nodeId
+
+        # Skip members removed since the last query. Each member is
+        # skipped at most once, so queries stay O(1) amortized
+        i = self.current[classId]
+        while i < len(members) and members[i] not in self.graph.nodes:
+            i += 1
+        self.current[classId] = i
+        return members[i] if i < len(members) else None
+
+    def isSameTree(self, nodeId1, nodeId2):
+        """ Return whether two nodes root identical subtrees """
+        return self.classOf[nodeId1] == self.classOf[nodeId2]
+
+    def equivalenceClass(self, nodeId):
+        """ Return the ids of every node identical to nodeId, including
+        nodeId, as a tuple with the largest id first """
+        return self.members[self.classOf[nodeId]]
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+import heapq
+from operator import itemgetter
+
+
+def duplicateReport(graph, top=10):
+    """ Given a graph, report every subtree that occurs more than once,
+    without changing the graph. Each row gives the class's value, an
+    example node id, its number of occurrences, its size, and the nodes
+    a merge would remove from its copies.
+    A merge removes every node but the largest id of its class. Each
+    removed node is charged once, to the topmost repeated subtree it
+    lies in, so rows do not overlap and their savings add up to the
+    removable count. Subtrees nested in a larger repeated subtree save
+    nothing of their own, unless they also occur outside it.
+    The size counts each class of the subtree once, under the parent
+    class with the largest id when it has several, so it is the tree
+    size for trees and never more than the number of classes.
+    Runs in a single pass over the nodes, children after parents.
+    top:
+        keep only this many rows, with the largest savings, or all
+        rows if None
+    returns a dict of node and class counts, the nodes a merge would
+    remove, and the rows sorted by savings, largest first """
+    classOf = graph.signatures()
+    occurrences = Counter(classOf.values())
+    classCount = len(occurrences)
+
+    # Class ids are contiguous, and children always have smaller ids
+    # than their parents, so buckets visited from the top down see
+    # every parent before its children
+    members = [[] for _ in range(classCount)]
+    for nodeId, classId in classOf.items():
+        members[classId].append(nodeId)
+    examples = [max(ids) for ids in members]  # The node a merge keeps
+
+    owners = {}  # Topmost repeated class above each node, by node id
+    treeParent = [None] * classCount
+    saved = Counter()
+    for classId in reversed(range(classCount)):
+        repeated = occurrences[classId] > 1
+        for nodeId in members[classId]:
+            owner = owners.pop(nodeId, classId if repeated else None)
+            if owner is not None and nodeId != examples[classId]:
+                saved[owner] += 1
+            for neighbor in graph.nodes[nodeId].neighbors:
+                child = classOf[neighbor.id]
+                parent = treeParent[child]
+                if parent is None or examples[classId] > examples[parent]:
+                    treeParent[child] = classId
+                if owner is None:
+                    continue
+                current = owners.get(neighbor.id)
+                if current is None or examples[owner] > examples[current]:
+                    owners[neighbor.id] = owner
+
+    sizes = [1] * classCount
+    for classId in range(classCount):
+        if treeParent[classId] is not None:
+            sizes[treeParent[classId]] += sizes[classId]
+
+    rows = (
+        {
+            'value': graph.nodes[examples[classId]].value,
+            'example': examples[classId],
+            'occurrences': occurrences[classId],
+            'size': sizes[classId],
+            'saved': saved[classId]
+        }
+        for classId in range(classCount) if occurrences[classId] > 1)
+    key = itemgetter('saved', 'size', 'example')
+    if top is None:
+        rows = sorted(rows, key=key, reverse=True)
+    else:
+        rows = heapq.nlargest(top, rows, key=key)
+
+    return {
+        'nodes': len(classOf),
+        'classes': classCount,
+        'removable': len(classOf) - classCount,
+        'duplicates': rows
+    }
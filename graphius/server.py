@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+    A long running merge service. Speaks a small subset of HTTP/1.1 over
+    a localhost TCP port or a Unix socket, one request per connection:
+        POST /merge    body is a JSON array of node records, the reply
+                       is the JSON array of merged nodes
+        GET /metrics   request counts and latency percentiles, as JSON
+    Merges run in a bounded executor, which also decodes the request and
+    encodes the reply, so the event loop only moves bytes. When
+    maxPending merges are already queued or running, new ones are refused
+    with 503 straight away, before their body is read.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import time
+
+from graphius.graphius import Graphius
+
+# Latencies kept for the percentiles of /metrics
+LATENCY_WINDOW = 1000
+
+# Default largest request body accepted, in bytes
+MAX_BODY = 64 << 20
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+def mergeRecords(records):
+    """ Merge a list of node records, return the merged nodes """
+    g = Graphius(records)
+    g.postOrderMerge()
+    return g.getNodes()
+
+
+def runMerge(function, body):
+    """ Decode a request body, merge it with function and encode the
+    result. Runs in the executor.
+    returns the JSON encoded merged nodes, as bytes """
+    records = json.loads(body.decode('utf-8'))
+    return json.dumps(function(records)).encode('utf-8')
+
+
+def percentile(ordered, fraction):
+    """ Given a sorted list, return its value at fraction, or None """
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class MergeServer(object):
+    """
+        Serves merges over HTTP.
+        executor:
+            runs the merges. Defaults to a pool of worker processes,
+            started by a fork server
+        maxPending:
+            most merges queued or running at once, defaults to twice
+            the number of workers
+        function:
+            merges a list of node records, mergeRecords by default.
+            Must be picklable for a process pool
+        maxBody:
+            largest request body accepted, in bytes. Up to maxPending
+            bodies are held in memory at once
+        counts:
+            a dict of requests served, merges, merges rejected with 503
+            and other failed requests
+        latencies:
+            the seconds taken by the latest merge requests
+    """
+    def __init__(self, workers=None, maxPending=None, executor=None,
+                 function=mergeRecords, maxBody=MAX_BODY):
+        workers = workers or os.cpu_count() or 1
+        if executor is None:
+            # Workers are started while requests are open. Forked straight
+            # from the server, they would hold client sockets open
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('forkserver'))
+        self.executor = executor
+        self.maxPending = maxPending or 2 * workers
+        self.function = function
+        self.maxBody = maxBody
+        self.pending = 0
+        self.counts = {'requests': 0, 'merges': 0, 'rejected': 0, 'errors': 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self, host='127.0.0.1', port=8080, path=None):
+        """ Start listening on a Unix socket at path if given, otherwise
+        on host and port. returns the asyncio server """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path=path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        """ Shut the executor down """
+        self.executor.shutdown(wait=True)
+
+    def metrics(self):
+        """ Return a dict of counts and latency percentiles, in seconds """
+        ordered = sorted(self.latencies)
+        result = dict(self.counts)
+        result['pending'] = self.pending
+        result['latency'] = {
+            'count': len(ordered),
+            'mean': sum(ordered) / len(ordered) if ordered else None,
+            'p50': percentile(ordered, 0.5),
+            'p95': percentile(ordered, 0.95),
+            'p99': percentile(ordered, 0.99),
+            'max': ordered[-1] if ordered else None
+        }
+        return result
+
+    async def handle(self, reader, writer):
+        """ Read one request, write its response, close the connection """
+        self.counts['requests'] += 1
+        try:
+            status, body = await self.respond(reader)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, body = 400, {'error': str(e)}
+        except Exception as e:
+            status, body = 500, {'error': "{}: {}".format(type(e).__name__, e)}
+        if status >= 400 and status != 503:
+            self.counts['errors'] += 1
+        # Merged nodes come back encoded, other bodies are small dicts
+        if isinstance(body, bytes):
+            payload = body
+        else:
+            payload = json.dumps(body).encode('utf-8')
+        writer.write(
+            "HTTP/1.1 {} {}\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: {}\r\n"
+            "Connection: close\r\n\r\n".format(
+                status, REASONS[status], len(payload)).encode('ascii') +
+            payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def respond(self, reader):
+        """ Parse a request and dispatch it.
+        returns a status code and a JSON style response body, or the
+        encoded JSON as bytes """
+        requestLine = (await reader.readline()).decode('latin-1').split()
+        if len(requestLine) != 3:
+            raise ValueError("Malformed request line")
+        method, target = requestLine[0], requestLine[1]
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if target == '/metrics':
+            if method != 'GET':
+                return 405, {'error': "Use GET for /metrics"}
+            return 200, self.metrics()
+        if target != '/merge':
+            return 404, {'error': "Unknown path: {}".format(target)}
+        if method != 'POST':
+            return 405, {'error': "Use POST for /merge"}
+
+        length = int(headers.get('content-length', 0))
+        if length > self.maxBody:
+            return 413, {'error': "Request body too large"}
+        return await self.merge(reader, length)
+
+    async def merge(self, reader, length):
+        """ Read a body of length bytes and merge it in the executor,
+        unless too many merges are pending. The pending slot is taken
+        before the body is read, so refused bodies are never buffered """
+        if self.pending >= self.maxPending:
+            self.counts['rejected'] += 1
+            return 503, {'error': "Too many pending merges"}
+
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            body = await reader.readexactly(length)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self.executor, runMerge, self.function, body)
+        except (KeyError, ValueError, TypeError) as e:
+            return 400, {'error': "{}: {}".format(type(e).__name__, e)}
+        finally:
+            self.pending -= 1
+        self.latencies.append(time.perf_counter() - start)
+        self.counts['merges'] += 1
+        return 200, result
+
+
+async def serve(host='127.0.0.1', port=8080, path=None, **kwargs):
+    """ Run a MergeServer until cancelled. kwargs go to MergeServer """
+    server = MergeServer(**kwargs)
+    listener = await server.start(host, port, path)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
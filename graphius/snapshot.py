@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+    A compact binary snapshot of a graph, laid out so it can be opened
+    with mmap and read in place. All integers are little endian int64.
+        header:
+            the 8 byte MAGIC, then node, edge and value counts, and
+            the byte length of the value table
+        ids, codes:
+            one integer per node, sorted by id
+        offsets:
+            n + 1 CSR offsets into the child array
+        children:
+            one child position per edge
+        value offsets:
+            v + 1 offsets into the value table
+        value table:
+            the JSON encoding of every distinct value, back to back
+"""
+from array import array
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+MAGIC = b'GRAPHIUS'
+HEADER = struct.Struct('<8sQQQQ')
+
+# Arrays are written and mapped in this byte order
+LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class SnapshotValues(object):
+    """ A read only list of node values, decoded from the value table
+    of a snapshot the first time each one is read """
+    def __init__(self, offsets, table):
+        self.offsets = offsets
+        self.table = table
+        self.decoded = {}  # Values, indexed by value code
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, code):
+        if code not in self.decoded:
+            start, end = self.offsets[code], self.offsets[code + 1]
+            self.decoded[code] = json.loads(
+                bytes(self.table[start:end]).decode('utf-8'))
+        return self.decoded[code]
+
+    def __iter__(self):
+        return (self[code] for code in range(len(self)))
+
+
+def toBytes(values):
+    """ Return a sequence of integers as little endian int64 bytes """
+    values = array('q', values)
+    if not LITTLE_ENDIAN:
+        values.byteswap()
+    return values.tobytes()
+
+
+def writeSnapshot(graph, path):
+    """ Given a CSRGraphius, write its arrays and values to path """
+    encoded = [
+        json.dumps(value, sort_keys=True).encode('utf-8')
+        for value in graph.values]
+    valueOffsets = [0]
+    for value in encoded:
+        valueOffsets.append(valueOffsets[-1] + len(value))
+
+    # Write next to path and move it into place, so a snapshot of a graph
+    # mapped from path itself is never truncated while in use
+    handle, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as fp:
+            writeArrays(fp, graph, encoded, valueOffsets)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def writeArrays(fp, graph, encoded, valueOffsets):
+    """ Write the header, arrays and value table of a snapshot to fp """
+    fp.write(HEADER.pack(
+        MAGIC,
+        len(graph.ids),
+        len(graph.children),
+        len(encoded),
+        valueOffsets[-1]))
+    for values in (
+            graph.ids, graph.codes, graph.offsets, graph.children,
+            valueOffsets):
+        fp.write(toBytes(values))
+    for value in encoded:
+        fp.write(value)
+
+
+def readSnapshot(path):
+    """ Map a snapshot file into memory.
+    returns the mapped buffer, and the ids, codes, offsets and children
+    arrays and the values list of the graph, all read in place """
+    with open(path, 'rb') as fp:
+        buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(buf) < HEADER.size:
+        raise ValueError("{} is not a graphius snapshot".format(path))
+    magic, n, e, v, tableSize = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("{} is not a graphius snapshot".format(path))
+
+    view = memoryview(buf)
+    position = HEADER.size
+    arrays = []
+    for count in (n, n, n + 1, e, v + 1):
+        end = position + 8 * count
+        if LITTLE_ENDIAN:
+            arrays.append(view[position:end].cast('q'))
+        else:
+            # Swapped copies, the file layout is always little endian
+            values = array('q', view[position:end].tobytes())
+            values.byteswap()
+            arrays.append(values)
+        position = end
+
+    if position + tableSize != len(buf):
+        raise ValueError("{} is truncated".format(path))
+    ids, codes, offsets, children, valueOffsets = arrays
+    values = SnapshotValues(valueOffsets, view[position:])
+    return buf, ids, codes, offsets, children, values
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import json
+import re
+
+# Characters read from a file object at a time
+CHUNK_SIZE = 1 << 16
+
+WHITESPACE = ' \t\r\n'
+SKIP_WHITESPACE = re.compile(r'[ \t\r\n]*')
+
+
+def iterRecords(fp, chunkSize=CHUNK_SIZE):
+    """ Given a file object holding either a JSON array of node records,
+    or newline delimited JSON with one record per line, yield the records
+    one at a time. Only the record being decoded is held in memory """
+    buf = fp.read(chunkSize)
+    start = len(buf) - len(buf.lstrip(WHITESPACE))
+    while start == len(buf):
+        more = fp.read(chunkSize)
+        if not more:
+            return  # Empty input
+        buf += more
+        start = len(buf) - len(buf.lstrip(WHITESPACE))
+
+    if buf[start] == '[':
+        records = iterArray(fp, buf, start + 1, chunkSize)
+    else:
+        records = iterLines(fp, buf[start:])
+    for record in records:
+        yield record
+
+
+def iterLines(fp, buf):
+    """ Yield one record per non blank line, starting with buf """
+    # The first chunk may end part way through a line
+    lines = (buf + fp.readline()).splitlines()
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+    for line in fp:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iterArray(fp, buf, pos, chunkSize):
+    """ Yield the elements of a JSON array, starting just after its
+    opening bracket at buf[pos]. More input is read from fp whenever
+    the buffer runs out part way through an element """
+    decoder = json.JSONDecoder()
+    first = True
+    eof = False
+    step = chunkSize
+    while True:
+        # Skip whitespace, and the comma between elements
+        while True:
+            pos = SKIP_WHITESPACE.match(buf, pos).end()
+            if pos < len(buf) or eof:
+                break
+            buf, pos, eof = refill(fp, buf, pos, chunkSize)
+
+        if pos == len(buf):
+            raise ValueError("Unterminated JSON array")
+        if buf[pos] == ']':
+            return
+        if not first:
+            if buf[pos] != ',':
+                raise ValueError(
+                    "Expected ',' between array elements, got {!r}".format(
+                        buf[pos]))
+            pos += 1
+            first = True
+            continue
+
+        try:
+            record, pos = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            # The element is cut off. Read more, in larger steps for
+            # elements bigger than a chunk
+            buf, pos, eof = refill(fp, buf, pos, step)
+            step *= 2
+            continue
+        first = False
+        step = chunkSize
+        yield record
+
+
+def refill(fp, buf, pos, chunkSize):
+    """ Drop the consumed part of buf and read another chunk.
+    returns the new buffer, position and whether fp is exhausted """
+    more = fp.read(chunkSize)
+    return buf[pos:] + more, 0, not more
+
+
+def writeRecords(fp, records, format='json', chunkSize=CHUNK_SIZE):
+    """ Given a file object and an iterable of JSON style records, write
+    them as a JSON array or as newline delimited JSON ('ndjson').
+    Encoded records are buffered and written about chunkSize
+    characters at a time, so the whole document is never held in memory.
+    returns the number of records written """
+    if format == 'json':
+        opening, separator, closing = '[', ', ', ']'
+    elif format == 'ndjson':
+        opening, separator, closing = '', '\n', '\n'
+    else:
+        raise ValueError("Unknown output format: {}".format(format))
+
+    encode = json.JSONEncoder().encode
+    chunk = [opening]
+    size = 0
+    count = 0
+    for record in records:
+        if count:
+            chunk.append(separator)
+        text = encode(record)
+        chunk.append(text)
+        size += len(text)
+        count += 1
+        if size >= chunkSize:
+            fp.write(''.join(chunk))
+            chunk = []
+            size = 0
+
+    if count or format == 'json':
+        chunk.append(closing)
+    fp.write(''.join(chunk))
+    return count
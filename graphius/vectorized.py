@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+    Height bucketed canonicalization with NumPy. Subtrees of different
+    heights can never be identical, so class ids are assigned one height
+    level at a time, with batched array operations over every node of
+    the level. The Python loop only runs once per level and degree.
+    NumPy is an optional dependency, only imported by these functions.
+"""
+
+
+def requireNumpy():
+    """ Import and return numpy, with a clear error if it is missing """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "The vectorized engine requires numpy: pip install numpy")
+    return numpy
+
+
+def ranges(np, starts, counts):
+    """ Return the concatenation of range(start, start + count) for
+    every start and count, as one array """
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.cumsum(counts)
+    shift = np.repeat(starts - (ends - counts), counts)
+    return np.arange(total, dtype=np.int64) + shift
+
+
+def distinct(np, values):
+    """ Return the sorted distinct values of an array, and how often
+    each occurs. Sorting is much faster than numpy.unique's hashing """
+    values = np.sort(values)
+    starts = np.flatnonzero(np.diff(values, prepend=values[:1] - 1))
+    return values[starts], np.diff(starts, append=values.size)
+
+
+def rowIds(np, keys):
+    """ Given a two dimensional key array, number its distinct rows.
+    returns the row numbers, indexed like keys, and the row count """
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64), 0
+
+    # Pack each row into one integer when the columns fit in 62 bits,
+    # so a plain sort replaces the much slower lexsort
+    bounds = [int(bound) + 1 for bound in keys.max(axis=0)]
+    size = 1
+    for bound in bounds:
+        size *= bound
+    if size < 1 << 62:
+        packed = np.zeros(len(keys), dtype=np.int64)
+        for column, bound in enumerate(bounds):
+            packed *= bound
+            packed += keys[:, column]
+        order = np.argsort(packed)
+        ordered = packed[order]
+        changed = ordered[1:] != ordered[:-1]
+    else:
+        order = np.lexsort(keys.T[::-1])
+        ordered = keys[order]
+        changed = np.any(ordered[1:] != ordered[:-1], axis=1)
+    numbers = np.zeros(len(keys), dtype=np.int64)
+    np.cumsum(changed, out=numbers[1:])
+    ids = np.empty(len(keys), dtype=np.int64)
+    ids[order] = numbers
+    return ids, int(numbers[-1]) + 1
+
+
+def levels(offsets, children):
+    """ Given CSR offsets and child positions, group positions by height,
+    leaves first, peeling the graph from the bottom as in Kahn's
+    algorithm. returns a list of position arrays, one per height """
+    np = requireNumpy()
+    n = len(offsets) - 1
+    degree = np.diff(offsets)
+    sources = np.repeat(np.arange(n, dtype=np.int64), degree)
+
+    # Reverse edges, so the parents of a level can be gathered at once
+    order = np.argsort(children, kind='stable')
+    parents = sources[order]
+    parentOffsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(children, minlength=n), out=parentOffsets[1:])
+
+    remaining = degree.copy()
+    frontier = np.flatnonzero(remaining == 0)
+    result = []
+    done = 0
+    while frontier.size:
+        result.append(frontier)
+        done += frontier.size
+        starts = parentOffsets[frontier]
+        edges = ranges(np, starts, parentOffsets[frontier + 1] - starts)
+        touched, counts = distinct(np, parents[edges])
+        remaining[touched] -= counts
+        frontier = touched[remaining[touched] == 0]
+
+    if done != n:
+        raise ValueError("Cycle detected, the vectorized engine needs a DAG")
+    return result
+
+
+def levelClasses(codes, offsets, children):
+    """ Given value codes, CSR offsets and child positions as integer
+    arrays, assign every position a class id. Positions share a class
+    exactly when they root identical subtrees.
+    returns an int64 array of class ids, indexed by position """
+    np = requireNumpy()
+    codes = np.asarray(codes, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    children = np.asarray(children, dtype=np.int64)
+    classes = np.full(len(codes), -1, dtype=np.int64)
+    count = 0
+
+    for rows in levels(offsets, children):
+        starts = offsets[rows]
+        edges = ranges(np, starts, offsets[rows + 1] - starts)
+        if edges.size == 0:
+            # Leaves, identical when their values are
+            ids, found = rowIds(np, codes[rows][:, None])
+            classes[rows] = count + ids
+            count += found
+            continue
+
+        # Distinct (row, child class) pairs, sorted by row then class.
+        # Rows are numbered within the level to keep the keys small
+        rowOf = np.repeat(np.arange(rows.size), offsets[rows + 1] - starts)
+        pairs = distinct(np, rowOf * count + classes[children[edges]])[0]
+        pairRows, pairClasses = pairs // count, pairs % count
+        degree = np.bincount(pairRows, minlength=rows.size)
+        first = np.zeros(rows.size, dtype=np.int64)
+        np.cumsum(degree[:-1], out=first[1:])
+
+        # Rows with the same number of distinct child classes are keyed
+        # on (value code, sorted child classes) and deduplicated at once
+        for d in np.unique(degree):
+            group = np.flatnonzero(degree == d)
+            keys = np.empty((group.size, d + 1), dtype=np.int64)
+            keys[:, 0] = codes[rows[group]]
+            keys[:, 1:] = pairClasses[
+                first[group][:, None] + np.arange(d)]
+            ids, found = rowIds(np, keys)
+            classes[rows[group]] = count + ids
+            count += found
+
+    return classes
+
+
+def collapseArrays(codes, offsets, children, classes):
+    """ Given value codes, CSR offsets, child positions and class ids,
+    keep the last position of each class and point kept positions at
+    the kept positions of their children's classes.
+    returns the kept positions, and the codes, offsets and children
+    of the collapsed graph """
+    np = requireNumpy()
+    codes = np.asarray(codes, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    children = np.asarray(children, dtype=np.int64)
+    n = len(codes)
+    positions = np.arange(n, dtype=np.int64)
+
+    rep = np.full(int(classes.max()) + 1 if n else 0, -1, dtype=np.int64)
+    np.maximum.at(rep, classes, positions)
+    kept = np.flatnonzero(rep[classes] == positions)
+    newPosition = np.full(n, -1, dtype=np.int64)
+    newPosition[kept] = np.arange(kept.size)
+
+    # Edges of kept positions, redirected and deduplicated
+    sources = np.repeat(positions, np.diff(offsets))
+    mask = newPosition[sources] >= 0
+    parents = newPosition[sources[mask]]
+    targets = newPosition[rep[classes[children[mask]]]]
+    pairs = distinct(np, parents * max(kept.size, 1) + targets)[0]
+    parents, targets = pairs // max(kept.size, 1), pairs % max(kept.size, 1)
+
+    newOffsets = np.zeros(kept.size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(parents, minlength=kept.size), out=newOffsets[1:])
+    return kept, codes[kept], newOffsets, targets
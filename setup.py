@@ -20,6 +20,11 @@ setup_requirements = [
     # TODO(abaratif): put setup requirements (distutils extensions, etc.) here
 ]
 
+extra_requirements = {
+    # Only needed by merge(engine='vectorized')
+    'vectorized': ['numpy'],
+}
+
 test_requirements = [
     # TODO: put package test requirements here
 ]
@@ -40,19 +45,23 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    # asyncio.run and ordered dicts need 3.7, blake2b digests 3.6
+    python_requires='>=3.7',
+    extras_require=extra_requirements,
     zip_safe=False,
     keywords='graphius',
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Intended Audience :: Developers',
         'Natural Language :: English',
-        "Programming Language :: Python :: 2",
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ],
     test_suite='tests',
     tests_require=test_requirements,
@@ -1,3 +1,12 @@
 # -*- coding: utf-8 -*-
 
 """Unit test package for graphius."""
+
+
+def sortedNodes(g):
+    """ Returns the nodes of a graph, or a list of node dicts, sorted by
+    id with sorted neighbors, so two graphs can be compared directly """
+    nodes = g.getNodes() if hasattr(g, 'getNodes') else g
+    return sorted(
+        (node['id'], node['value'], sorted(node['neighbors']))
+        for node in nodes)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the batch merge of `graphius` package."""
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from graphius.batch import expandInputs, mergeFiles
+from tests import test_graphius
+
+
+class TestBatch(unittest.TestCase):
+    """Tests for `graphius.batch` module."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for i, example in enumerate((
+                test_graphius.TestGraphius.EXAMPLE1,
+                test_graphius.TestGraphius.EXAMPLE3)):
+            with open(self.path('graph{}.json'.format(i)), 'w') as fp:
+                json.dump(example, fp)
+        with open(self.path('broken.json'), 'w') as fp:
+            fp.write('[{"id": 1')
+        with open(self.path('notes.txt'), 'w') as fp:
+            fp.write('not a graph')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        """ Returns the path of a file in the test directory """
+        return os.path.join(self.directory, name)
+
+    def test_1_expandInputs(self):
+        """ Test directories, globs and plain paths are expanded """
+        assert(expandInputs([self.directory]) == [
+            self.path('broken.json'),
+            self.path('graph0.json'),
+            self.path('graph1.json')])
+        assert(expandInputs([self.path('graph*.json')]) == [
+            self.path('graph0.json'),
+            self.path('graph1.json')])
+        assert(expandInputs(['missing.json']) == ['missing.json'])
+
+    def test_2_mergeFiles(self):
+        """ Test errors are reported per file, in input order """
+        paths = [self.path('graph0.json'), self.path('broken.json'),
+                 'missing.json', self.path('graph1.json')]
+        results = list(mergeFiles(paths, workers=1))
+
+        assert([path for path, _, _ in results] == paths)
+        assert(len(results[0][1]) == 8)
+        assert(results[1][1] is None and results[1][2])
+        assert(results[2][2].startswith('FileNotFoundError'))
+        assert(len(results[3][1]) == 3)
+
+    def test_3_mergeFiles(self):
+        """ Test a worker pool writes one output file per input """
+        output = self.path('out')
+        os.mkdir(output)
+        paths = expandInputs([self.path('graph*.json')])
+        results = list(mergeFiles(paths, output, 'ndjson', workers=2))
+
+        assert([count for _, count, _ in results] == [8, 3])
+        with open(os.path.join(output, 'graph1.json')) as fp:
+            assert(len(fp.read().splitlines()) == 3)
+
+    def test_4_mergeFiles(self):
+        """ Test inputs with the same file name do not overwrite each
+        other's output """
+        output = self.path('out')
+        os.mkdir(output)
+        os.mkdir(self.path('other'))
+        shutil.copy(self.path('graph0.json'), self.path('other/graph1.json'))
+        paths = [self.path('graph1.json'), self.path('other/graph1.json')]
+        results = list(mergeFiles(paths, output, 'ndjson', workers=2))
+
+        assert(results[0] == (paths[0], 3, None))
+        assert(results[1][0] == paths[1] and results[1][1] is None)
+        assert('overwrite' in results[1][2])
+        with open(os.path.join(output, 'graph1.json')) as fp:
+            assert(len(fp.read().splitlines()) == 3)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the signature cache of `graphius` package."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from graphius.cache import SignatureCache
+from graphius.graphius import Graphius
+from tests import sortedNodes, test_graphius
+
+
+class TestCache(unittest.TestCase):
+    """Tests for `graphius.cache` module."""
+    EXAMPLE1 = test_graphius.TestGraphius.EXAMPLE1
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_1_merge(self):
+        """ Test a cached merge gives the same result as hashcons """
+        expected = Graphius(self.EXAMPLE1)
+        expected.merge(engine='hashcons')
+        with SignatureCache(self.path) as cache:
+            g = Graphius(self.EXAMPLE1)
+            g.merge(engine='hashcons', cache=cache)
+
+            assert(sortedNodes(g) == sortedNodes(expected))
+            assert(cache.stats()['misses'] == 8)
+            assert(len(cache) == 8)
+
+    def test_2_canonical(self):
+        """ Test a later run keeps the ids an earlier run kept """
+        with SignatureCache(self.path) as cache:
+            g = Graphius(self.EXAMPLE1)
+            g.merge(engine='hashcons', cache=cache)
+
+        # The same subtrees again, now with larger ids
+        shifted = [
+            {'id': node['id'] + 100, 'value': node['value'],
+             'children': [child + 100 for child in node['children']]}
+            for node in self.EXAMPLE1]
+        with SignatureCache(self.path) as cache:
+            g = Graphius(self.EXAMPLE1 + shifted)
+            g.merge(engine='hashcons', cache=cache)
+
+            assert(cache.stats()['hits'] == 8)
+            assert(cache.stats()['hitRate'] == 1.0)
+            assert(sorted(g.nodes) == [1, 2, 8, 9, 10, 11, 12, 13])
+
+    def test_3_evict(self):
+        """ Test least recently used entries are evicted first """
+        with SignatureCache(self.path, maxEntries=8) as cache:
+            g = Graphius(self.EXAMPLE1)
+            g.merge(engine='hashcons', cache=cache)
+            g = Graphius([{'id': 1, 'value': 'Z', 'children': []}])
+            g.merge(engine='hashcons', cache=cache)
+
+            assert(cache.evictions == 1)
+            assert(len(cache) == 8)
+
+            # The newest entry survived
+            g = Graphius([{'id': 1, 'value': 'Z', 'children': []}])
+            g.merge(engine='hashcons', cache=cache)
+            assert(cache.hits == 1)
+
+    def test_4_engine(self):
+        """ Test the cache is refused by engines it does not support """
+        with SignatureCache(self.path) as cache:
+            g = Graphius(self.EXAMPLE1)
+            with self.assertRaises(ValueError):
+                g.merge(cache=cache)
+
+    def test_5_digests(self):
+        """ Test digests per class match digests per node """
+        from graphius.digest import recordDigests
+        from graphius.parallel import encode
+        g = Graphius(self.EXAMPLE1)
+        classes = g.signatures()
+        digests = g.classDigests(classes)
+        expected = recordDigests(encode(g.nodes.values()))
+
+        assert(len(digests) == 8)
+        assert(all(
+            digests[classId] == expected[nodeId]
+            for nodeId, classId in classes.items()))
+
+    def test_6_keepRoots(self):
+        """ Test duplicate roots are kept on request, as postOrderMerge
+        keeps them """
+        nodes = [
+            {'id': 1, 'value': 'A', 'children': [2]},
+            {'id': 2, 'value': 'B', 'children': []},
+            {'id': 3, 'value': 'A', 'children': [4]},
+            {'id': 4, 'value': 'B', 'children': []},
+        ]
+        with SignatureCache(self.path) as cache:
+            g = Graphius(nodes)
+            g.merge(engine='hashcons', cache=cache, keepRoots=True)
+
+        assert(sortedNodes(g) == [
+            (1, 'A', [4]), (3, 'A', [4]), (4, 'B', [])])
+        with self.assertRaises(ValueError):
+            Graphius(nodes).merge(keepRoots=True)
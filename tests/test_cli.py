@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the `graphius` CLI."""
+
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import cli
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+class TestCli(unittest.TestCase):
+    """Tests for `cli` module."""
+
+    def run_cli(self, *args):
+        """ Returns what the CLI prints to stdout for the given args """
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            cli.main(list(args))
+        return out.getvalue()
+
+    def example(self, name):
+        """ Returns the path of an example file """
+        return os.path.join(EXAMPLES, name)
+
+    def test_1_main(self):
+        """ Test merging example 3 """
+        result = json.loads(self.run_cli(self.example('example3.json')))
+
+        assert(len(result) == 3)
+
+    def test_2_stream(self):
+        """ Test --stream merges to as many nodes as a full load """
+        for name in ('example1.json', 'example2.json', 'example3.json'):
+            path = self.example(name)
+            loaded = json.loads(self.run_cli(path))
+            streamed = json.loads(self.run_cli('--stream', path))
+
+            assert(len(loaded) == len(streamed))
+
+    def test_3_format(self):
+        """ Test --format ndjson writes one node per line """
+        lines = self.run_cli(
+            '--format', 'ndjson', self.example('example3.json')).splitlines()
+
+        assert(len(lines) == 3)
+        values = {json.loads(line)['value'] for line in lines}
+        assert(values == {'A', 'B', 'C'})
+
+    def test_4_stats(self):
+        """ Test --stats prints merge counts to stderr only """
+        err = io.StringIO()
+        with contextlib.redirect_stderr(err):
+            result = json.loads(
+                self.run_cli('--stats', self.example('example3.json')))
+
+        assert(len(result) == 3)
+        stats = json.loads(err.getvalue())
+        assert(stats['removed'] == stats['parsed'] - 3)
+        assert('load' in stats['seconds'])
+
+    def test_5_cache(self):
+        """ Test --cache merges as usual and fills the cache """
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'cache.db')
+            for _ in range(2):
+                result = json.loads(self.run_cli(
+                    '--cache', path, self.example('example3.json')))
+                assert(len(result) == 3)
+            assert(os.path.exists(path))
+
+            # Duplicate roots are kept with or without the cache
+            roots = os.path.join(directory, 'roots.json')
+            with open(roots, 'w') as fp:
+                json.dump([
+                    {'id': 1, 'value': 'A', 'children': [2]},
+                    {'id': 2, 'value': 'B', 'children': []},
+                    {'id': 3, 'value': 'A', 'children': [4]},
+                    {'id': 4, 'value': 'B', 'children': []}], fp)
+            plain = json.loads(self.run_cli(roots))
+            cached = json.loads(self.run_cli('--cache', path, roots))
+            assert(len(plain) == len(cached) == 3)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_6_batch(self):
+        """ Test batch writes one line per file and reports failures """
+        err = io.StringIO()
+        with contextlib.redirect_stderr(err):
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                status = cli.main([
+                    'batch', '--workers', '1',
+                    self.example('example3.json'), 'missing.json'])
+
+        assert(status == 1)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert(len(lines[0]['merged']) == 3)
+        assert('error' in lines[1])
+        assert('missing.json' in err.getvalue())
+
+    def test_7_external(self):
+        """ Test --external merges as many nodes away as a full load """
+        for name in ('example1.json', 'example2.json', 'example3.json'):
+            path = self.example(name)
+            loaded = json.loads(self.run_cli(path))
+            external = json.loads(self.run_cli('--external', path))
+
+            assert(len(loaded) == len(external))
+
+    def test_8_columnar(self):
+        """ Test --format columnar writes one object of parallel lists """
+        result = json.loads(self.run_cli(
+            '--format', 'columnar', self.example('example3.json')))
+
+        assert(len(result['ids']) == 3)
+        assert(sorted(result['values']) == ['A', 'B', 'C'])
+        assert(result['offsets'][-1] == len(result['neighbors']) == 3)
+
+    def test_9_report(self):
+        """ Test the report subcommand lists the repeated leaf """
+        result = json.loads(self.run_cli(
+            'report', self.example('example3.json')))
+
+        assert(result['removable'] == 1)
+        assert(result['duplicates'][0]['value'] == 'B')
+
+    def test_10_stable(self):
+        """ Test example 3 merges to the documented ids in every process,
+        whatever the memory addresses of the nodes """
+        script = os.path.join(os.path.dirname(__file__), '..', 'cli.py')
+        for _ in range(6):
+            out = subprocess.check_output(
+                [sys.executable, script, self.example('example3.json')])
+            result = sorted(
+                (node['id'], node['value'], sorted(node['neighbors']))
+                for node in json.loads(out.decode()))
+
+            assert(result == [(1, 'A', [3, 4]), (3, 'C', [4]), (4, 'B', [])])
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the CSR backend of `graphius` package."""
+
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from graphius.cache import SignatureCache
+from graphius.csr import CSRGraphius
+from graphius.graphius import Graphius
+from tests import sortedNodes, test_graphius
+
+
+class TestCSRGraphius(test_graphius.TestGraphius):
+    """Run the `graphius` tests against the CSR backend."""
+
+    def setUp(self):
+        """Make the CSR backend the default."""
+        Graphius.defaultBackend = 'csr'
+
+    def tearDown(self):
+        """Restore the default backend."""
+        Graphius.defaultBackend = 'objects'
+
+    @unittest.skip("CSR views can not be marked for deletion")
+    def test_37_iterative(self):
+        pass
+
+    def test_45_update(self):
+        """ Test adding a subtree that duplicates an existing one. The
+        arrays are merged whole, so every node is looked up again """
+        g = Graphius(self.EXAMPLE2)
+        g.postOrderMerge()
+        g.update([
+            {'id': 20, 'value': 'H', 'children': [21]},
+            {'id': 21, 'value': 'C', 'children': [22, 23]},
+            {'id': 22, 'value': 'D', 'children': [24]},
+            {'id': 23, 'value': 'E', 'children': [25]},
+            {'id': 24, 'value': 'F', 'children': []},
+            {'id': 25, 'value': 'X', 'children': []},
+        ])
+
+        assert(len(g.nodes) == 12)
+        assert(g.nodes[20].neighbors == g.nodes[8].neighbors)
+        with self.assertRaises(KeyError):
+            g.update(edges=[(1, 99)])
+        assert(len(g.nodes) == 12)
+
+    @unittest.skip("The CSR backend has no edge level updates")
+    def test_53_unlink(self):
+        pass
+
+    @unittest.skip("CSR views can not be marked for deletion")
+    def test_61_clean(self):
+        pass
+
+    def test_csr_1_backend(self):
+        """ Test the backend is picked at construction time """
+        assert(type(Graphius(self.EXAMPLE3)) is CSRGraphius)
+        assert(type(Graphius(self.EXAMPLE3, backend='objects')) is Graphius)
+        with self.assertRaises(ValueError):
+            Graphius(self.EXAMPLE3, backend='unknown')
+
+    def test_csr_2_parse(self):
+        """ Test the arrays for example 3 """
+        g = Graphius(self.EXAMPLE3)
+
+        assert(list(g.ids) == [1, 2, 3, 4])
+        assert(g.values == ['A', 'B', 'C'])
+        assert(list(g.codes) == [0, 1, 2, 1])
+        assert(list(g.offsets) == [0, 2, 2, 3, 3])
+        assert(list(g.children) == [1, 2, 3])
+
+    def test_csr_3_postOrderMerge(self):
+        """ Test the arrays are rebuilt by a merge of example 3 """
+        g = Graphius(self.EXAMPLE3)
+        g.postOrderMerge()
+
+        assert(list(g.ids) == [1, 3, 4])
+        assert(list(g.offsets) == [0, 2, 3, 3])
+        assert(sorted(g.getNodes(), key=lambda node: node['id']) == [
+            {'id': 1, 'value': 'A', 'neighbors': [3, 4]},
+            {'id': 3, 'value': 'C', 'neighbors': [4]},
+            {'id': 4, 'value': 'B', 'neighbors': []}])
+
+    def test_csr_4_parse(self):
+        """ Test unknown children raise like the object backend """
+        with self.assertRaises(KeyError):
+            Graphius([{'id': 1, 'value': 'A', 'children': [2]}])
+
+    def test_csr_5_keepRoots(self):
+        """ Test every engine that can keep roots keeps duplicate roots,
+        and postOrderMerge gives the same output as the object backend """
+        nodes = [
+            {'id': 1, 'value': 'A', 'children': [2]},
+            {'id': 2, 'value': 'B', 'children': []},
+            {'id': 3, 'value': 'A', 'children': [4]},
+            {'id': 4, 'value': 'B', 'children': []},
+            {'id': 5, 'value': 'C', 'children': [6]},
+            {'id': 6, 'value': 'A', 'children': [7]},
+            {'id': 7, 'value': 'B', 'children': []},
+        ]
+        expected = [(1, 'A', [7]), (3, 'A', [7]), (5, 'C', [3]), (7, 'B', [])]
+        for engine in ('hashcons', 'parallel', 'vectorized', 'bisimulation'):
+            g = Graphius(nodes)
+            g.merge(engine=engine, keepRoots=True)
+            assert(sortedNodes(g) == expected)
+        with self.assertRaises(ValueError):
+            Graphius(nodes).merge(keepRoots=True)
+
+        rng = random.Random(3)
+        dags = [
+            [{'id': i, 'value': rng.choice('AB'), 'children': [
+                j for j in range(i + 1, 12) if rng.random() < 0.2]}
+             for i in range(12)]
+            for _ in range(50)]
+        for example in [nodes, self.EXAMPLE1, self.EXAMPLE3] + dags:
+            objects = Graphius(example, backend='objects')
+            objects.postOrderMerge()
+            g = Graphius(example)
+            g.postOrderMerge()
+            assert(sortedNodes(g) == sortedNodes(objects))
+
+    def test_csr_6_cache(self):
+        """ Test a cached merge on the arrays keeps the cached ids """
+        directory = tempfile.mkdtemp()
+        try:
+            with SignatureCache(os.path.join(directory, 'c.db')) as cache:
+                first = Graphius(self.EXAMPLE1, backend='objects')
+                first.merge(engine='hashcons', cache=cache)
+                g = Graphius(self.EXAMPLE1)
+                g.merge(engine='hashcons', cache=cache)
+                assert(type(g) is CSRGraphius)
+                assert(sortedNodes(g) == sortedNodes(first))
+                assert(cache.stats()['hits'] > 0)
+                with self.assertRaises(ValueError):
+                    Graphius(self.EXAMPLE1).merge(cache=cache)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_csr_7_update(self):
+        """ Test updates keep the same nodes as the object backend """
+        for seed in range(40):
+            rng = random.Random(seed)
+            records = [
+                {'id': i, 'value': rng.choice('AB'), 'children': [
+                    j for j in range(i + 1, 25) if rng.random() < 0.2]}
+                for i in range(25)]
+            objects = Graphius(records, backend='objects')
+            g = Graphius(records)
+            if seed % 2:
+                objects.postOrderMerge()
+                g.postOrderMerge()
+            for nodeId in range(25, 31):
+                data = [{'id': nodeId, 'value': rng.choice('AB'),
+                         'children': []}]
+                edges = []
+                if objects.equivalenceIndex is not None:
+                    data[0]['children'] = [
+                        i for i in sorted(objects.nodes) if rng.random() < 0.1]
+                    if not data[0]['children']:
+                        edges = [(rng.choice(sorted(objects.nodes)), nodeId)]
+                objects.update(data, edges)
+                g.update([dict(data[0])], edges)
+
+                assert(sortedNodes(g) == sortedNodes(objects))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the out of core merge of `graphius` package."""
+
+
+import io
+import json
+import unittest
+
+from graphius.external import ExternalGraph, externalMerge
+from graphius.graphius import Graphius
+from tests import sortedNodes, test_graphius
+
+
+class TestExternal(unittest.TestCase):
+    """Tests for `graphius.external` module."""
+    EXAMPLE1 = test_graphius.TestGraphius.EXAMPLE1
+    EXAMPLE2 = test_graphius.TestGraphius.EXAMPLE2
+    EXAMPLE3 = test_graphius.TestGraphius.EXAMPLE3
+
+    def test_1_externalMerge(self):
+        """ Test the out of core merge gives the same result as hashcons """
+        for example in (self.EXAMPLE1, self.EXAMPLE2, self.EXAMPLE3):
+            expected = Graphius(example)
+            expected.merge(engine='hashcons')
+            out = io.StringIO()
+            count = externalMerge(example, out, memoryBudget=1 << 16)
+
+            assert(count == len(expected.nodes))
+            assert(sortedNodes(json.loads(out.getvalue())) ==
+                   sortedNodes(expected.getNodes()))
+
+    def test_2_order(self):
+        """ Test nodes come out in id order, with JSON values intact """
+        nodes = [
+            {'id': 3, 'value': {'b': 1, 'a': [1, 2]}, 'children': []},
+            {'id': 1, 'value': None, 'children': [2, 3]},
+            {'id': 2, 'value': {'a': [1, 2], 'b': 1}, 'children': []},
+        ]
+        with ExternalGraph() as graph:
+            graph.load(nodes)
+            graph.merge()
+
+            assert(list(graph.iterNodes()) == [
+                {'id': 1, 'value': None, 'neighbors': [3]},
+                {'id': 3, 'value': {'a': [1, 2], 'b': 1}, 'neighbors': []},
+            ])
+
+    def test_3_errors(self):
+        """ Test missing children and cycles are refused """
+        with ExternalGraph() as graph:
+            with self.assertRaises(KeyError):
+                graph.load([{'id': 1, 'value': 'A', 'children': [2]}])
+
+        with ExternalGraph() as graph:
+            graph.load([
+                {'id': 1, 'value': 'A', 'children': [2]},
+                {'id': 2, 'value': 'A', 'children': [1]},
+            ])
+            with self.assertRaises(ValueError):
+                graph.merge()
@@ -4,11 +4,19 @@
 """Tests for `graphius` package."""
 
 
+import random
 import unittest
 
+from graphius.equivalence import EquivalenceIndex
 from graphius.graphius import Graphius
 from graphius.node import GraphiusNode
 from pprint import pprint
+from tests import sortedNodes
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestGraphius(unittest.TestCase):
@@ -361,8 +369,8 @@ class TestGraphius(unittest.TestCase):
     def test_23_getEquivNode(self):
         """ Test getting two equiv nodes in example 1 """
         g = Graphius(self.EXAMPLE1)
-        seen = {}
-        seen[g.nodes[7].value] = g.nodes[7]
+        seen = EquivalenceIndex()
+        seen.resolve(g.nodes[7])
         assert(g.getEquivNode(g.nodes[12], seen) == g.nodes[7])
 
     def test_24_getEquivNode(self):
@@ -377,9 +385,9 @@ class TestGraphius(unittest.TestCase):
             ]
 
         g = Graphius(nodes)
-        seen = {}
+        seen = EquivalenceIndex()
         for i in range(1, 7):
-            seen[g.nodes[i].value] = g.nodes[i]
+            seen.resolve(g.nodes[i])
         assert(g.getEquivNode(g.nodes[1], seen) == g.nodes[1])
 
     def test_25_roots(self):
@@ -437,3 +445,461 @@ class TestGraphius(unittest.TestCase):
 
         assert(len(g.nodes) == 3)
         assert(len(g.nodes[3].neighbors) == 1)
+
+    def test_31_signatures(self):
+        """ Test signatures for the identical subtrees in example 1 """
+        g = Graphius(self.EXAMPLE1)
+        classes = g.signatures()
+
+        assert(classes[3] == classes[9])
+        assert(classes[5] == classes[10])
+        assert(classes[2] != classes[8])
+        assert(len(set(classes.values())) == 8)
+
+    def test_32_hashconsMerge(self):
+        """ Test the hashcons engine gives the same result as merge """
+        for example in (self.EXAMPLE1, self.EXAMPLE2, self.EXAMPLE3):
+            expected = Graphius(example)
+            expected.merge()
+            g = Graphius(example)
+            g.merge(engine='hashcons')
+
+            assert(sortedNodes(g) == sortedNodes(expected))
+
+    def test_33_hashconsMerge(self):
+        """ Test the hashcons engine keeps as many nodes as
+        postOrderMerge """
+        for example in (self.EXAMPLE1, self.EXAMPLE2, self.EXAMPLE3):
+            expected = Graphius(example)
+            expected.postOrderMerge()
+            g = Graphius(example)
+            g.merge(engine='hashcons')
+
+            assert(len(g.nodes) == len(expected.nodes))
+
+    def test_34_merge(self):
+        """ Test merge rejects unknown engines """
+        g = Graphius(self.EXAMPLE3)
+        with self.assertRaises(ValueError):
+            g.merge(engine='unknown')
+
+    def chain(self, depth):
+        """ Returns a linked list shaped graph of the given depth,
+        alternating between two values """
+        return [
+            {'id': i, 'value': 'AB'[i % 2],
+             'children': [i + 1] if i < depth else []}
+            for i in range(1, depth + 1)]
+
+    def test_35_iterative(self):
+        """ Test iterative and recursive traversals agree """
+        for example in (self.EXAMPLE1, self.EXAMPLE2, self.EXAMPLE3):
+            recursive = Graphius(example, iterative=False)
+            recursive.postOrderMerge()
+            g = Graphius(example)
+            g.postOrderMerge()
+            assert(len(g.nodes) == len(recursive.nodes))
+
+            recursive = Graphius(example, iterative=False)
+            recursive.merge()
+            g = Graphius(example)
+            g.merge()
+            assert(sortedNodes(g) == sortedNodes(recursive))
+            assert(
+                self.nodeTuples(g.dfs(g.nodes[1]).values()) ==
+                self.nodeTuples(recursive.dfs(recursive.nodes[1]).values()))
+
+    def test_36_iterative(self):
+        """ Test deep chains well past the recursion limit """
+        depth = 20000
+        g = Graphius(self.chain(depth))
+
+        assert(len(g.dfs(g.nodes[1])) == depth)
+        g.postOrderMerge()
+        assert(len(g.nodes) == depth)
+
+    def test_37_iterative(self):
+        """ Test markMergedIterative marks a whole deep chain """
+        g = Graphius(self.chain(20000))
+        g.markMergedIterative(g.nodes[1])
+
+        assert(not any(node.safe for node in g.nodes.values()))
+
+    def lattice(self, depth):
+        """ Returns a DAG of two nodes per level, where both nodes of
+        each level point at both nodes of the next. There are 2^depth
+        paths from the roots to the bottom """
+        nodes = []
+        for level in range(depth):
+            children = [] if level == depth - 1 else [
+                2 * level + 2, 2 * level + 3]
+            nodes.append(
+                {'id': 2 * level, 'value': 'X', 'children': children})
+            nodes.append(
+                {'id': 2 * level + 1, 'value': 'Y', 'children': children})
+        return nodes
+
+    def test_38_postOrderMerge(self):
+        """ Test shared subtrees are resolved once, not once per path """
+        for iterative in (True, False):
+            g = Graphius(self.lattice(60), iterative=iterative)
+            g.postOrderMerge()
+
+            assert(len(g.nodes) == 120)
+
+    def test_39_postOrderMergeHelper(self):
+        """ Test a memoized node is returned without re-traversal """
+        g = Graphius(self.EXAMPLE1)
+        memo = {g.nodes[3]: g.nodes[9]}
+
+        assert(g.postOrderMergeHelper(g.nodes[3], {}, memo) == g.nodes[9])
+        assert(
+            g.postOrderMergeHelperIterative(g.nodes[3], {}, memo) ==
+            g.nodes[9])
+
+    def test_40_getEquivNode(self):
+        """ Test nodes sharing a value but not children keep
+        separate slots """
+        nodes = [
+            {'id': 1, 'value': 'A', 'children': [3]},
+            {'id': 2, 'value': 'A', 'children': [4]},
+            {'id': 3, 'value': 'B', 'children': []},
+            {'id': 4, 'value': 'C', 'children': []},
+            {'id': 5, 'value': 'A', 'children': [3]},
+        ]
+        g = Graphius(nodes)
+        seen = EquivalenceIndex()
+        seen.resolve(g.nodes[1])
+        seen.resolve(g.nodes[2])
+
+        # Node 2 did not overwrite the slot of node 1
+        assert(g.getEquivNode(g.nodes[5], seen) == g.nodes[1])
+        assert(seen.stats() == {
+            'lookups': 3, 'hits': 1, 'misses': 2, 'classes': 2})
+
+    def test_41_equivalenceStats(self):
+        """ Test lookup counts after merging example 1 """
+        g = Graphius(self.EXAMPLE1)
+        assert(g.equivalenceStats()['lookups'] == 0)
+        g.postOrderMerge()
+        stats = g.equivalenceStats()
+
+        assert(stats['hits'] == 5)
+        assert(stats['classes'] == 8)
+
+    def test_42_node(self):
+        """ Test nodes are slotted and intern their values """
+        node1 = GraphiusNode(id=1, value=''.join(['A', 'B']))
+        node2 = GraphiusNode(id=2, value=''.join(['A', 'B']))
+
+        assert(not hasattr(node1, '__dict__'))
+        assert(node1.value is node2.value)
+
+    def test_43_node(self):
+        """ Test addNeighbor only type checks in validation mode """
+        node1 = GraphiusNode(id=1, value='A')
+        node1.addNeighbor('B')
+
+        GraphiusNode.validate = True
+        try:
+            with self.assertRaises(AssertionError):
+                node1.addNeighbor('C')
+        finally:
+            GraphiusNode.validate = False
+
+    def test_44_getNodes(self):
+        """ Test getNodes output for example 3 """
+        g = Graphius(self.EXAMPLE3)
+
+        assert(sorted(g.getNodes(), key=lambda node: node['id'])[2] == {
+            'id': 3, 'value': 'C', 'neighbors': [4]})
+
+    def test_45_update(self):
+        """ Test adding a subtree that duplicates an existing one """
+        g = Graphius(self.EXAMPLE2)
+        g.postOrderMerge()
+        lookups = g.equivalenceStats()['lookups']
+
+        # A new H -> C subtree, identical to the second half of example 2
+        g.update([
+            {'id': 20, 'value': 'H', 'children': [21]},
+            {'id': 21, 'value': 'C', 'children': [22, 23]},
+            {'id': 22, 'value': 'D', 'children': [24]},
+            {'id': 23, 'value': 'E', 'children': [25]},
+            {'id': 24, 'value': 'F', 'children': []},
+            {'id': 25, 'value': 'X', 'children': []},
+        ])
+
+        # Only the new nodes were looked up, and all but the root merged
+        assert(g.equivalenceStats()['lookups'] - lookups == 6)
+        assert(len(g.nodes) == 12)
+        assert(g.nodes[20].neighbors == g.nodes[8].neighbors)
+
+    def test_46_update(self):
+        """ Test new edges re-merge the ancestors of the changed node """
+        nodes = [
+            {'id': 1, 'value': 'R', 'children': [2, 4]},
+            {'id': 2, 'value': 'A', 'children': [3]},
+            {'id': 3, 'value': 'B', 'children': []},
+            {'id': 4, 'value': 'A', 'children': [5]},
+            {'id': 5, 'value': 'B', 'children': [6]},
+            {'id': 6, 'value': 'C', 'children': []},
+        ]
+        g = Graphius(nodes)
+        g.postOrderMerge()
+        assert(len(g.nodes) == 6)
+
+        # 3:B gains the C child, so 2:A and 4:A become identical
+        g.update(edges=[(3, 6)])
+
+        assert(len(g.nodes) == 4)
+        assert(len(g.nodes[1].neighbors) == 1)
+
+    def test_47_update(self):
+        """ Test update merges a graph that was not merged yet """
+        g = Graphius(self.EXAMPLE1)
+        g.update(edges=[(8, 2)])
+
+        assert(len(g.nodes) == 8)
+        assert(g.nodes[2] in g.nodes[8].neighbors)
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_48_vectorizedMerge(self):
+        """ Test the vectorized engine gives the same result as merge """
+        for example in (self.EXAMPLE1, self.EXAMPLE2, self.EXAMPLE3):
+            expected = Graphius(example)
+            expected.merge()
+            g = Graphius(example)
+            g.merge(engine='vectorized')
+
+            assert(sortedNodes(g) == sortedNodes(expected))
+
+    @unittest.skipIf(numpy is None, "requires numpy")
+    def test_49_vectorizedMerge(self):
+        """ Test repeated children count once, as with hashcons """
+        nodes = [
+            {'id': 1, 'value': 'R', 'children': [2, 5]},
+            {'id': 2, 'value': 'A', 'children': [3, 4]},
+            {'id': 3, 'value': 'B', 'children': []},
+            {'id': 4, 'value': 'B', 'children': []},
+            {'id': 5, 'value': 'A', 'children': [6]},
+            {'id': 6, 'value': 'B', 'children': []},
+        ] + [
+            {'id': node['id'] + 100, 'value': node['value'],
+             'children': [child + 100 for child in node['children']]}
+            for node in self.lattice(12)]
+        expected = Graphius(nodes)
+        expected.merge(engine='hashcons')
+        g = Graphius(nodes)
+        g.merge(engine='vectorized')
+
+        assert(sortedNodes(g) == sortedNodes(expected))
+        assert(len(g.nodes) == 27)
+
+    def test_50_stats(self):
+        """ Test stats are only recorded when enabled """
+        g = Graphius(self.EXAMPLE1)
+        g.postOrderMerge()
+
+        assert(g.stats is None)
+
+        g = Graphius(self.EXAMPLE1, stats=True)
+        g.postOrderMerge()
+        g.getNodes()
+
+        assert(g.stats['parsed'] == 13)
+        assert(g.stats['visited'] == 13)
+        assert(g.stats['lookups'] == 13)
+        assert(g.stats['hits'] == g.stats['merged'] == 5)
+        assert(g.stats['removed'] == 5)
+        assert(set(g.stats['seconds']) >= {'parse', 'merge', 'serialize'})
+
+    def test_51_stats(self):
+        """ Test merge engines count merged nodes """
+        for engine in ('bruteforce', 'hashcons'):
+            g = Graphius(self.EXAMPLE1, stats=True)
+            g.merge(engine=engine)
+
+            assert(g.stats['merged'] == 13 - len(g.nodes))
+            assert(g.stats['lookups'] == 13)
+            assert(g.stats['hits'] == 13 - len(g.nodes))
+            assert('merge' in g.stats['seconds'])
+
+    def test_52_roots(self):
+        """ Test roots stay current through merges """
+        for engine in (None, 'hashcons'):
+            g = Graphius(self.EXAMPLE1)
+            if engine is None:
+                g.postOrderMerge()
+            else:
+                g.merge(engine=engine)
+
+            assert({node.id for node in g.roots()} == {1, 8})
+            assert(all(node.id in g.nodes for node in g.roots()))
+
+    def test_53_unlink(self):
+        """ Test nodes are removed with their last parent reference """
+        g = Graphius(self.EXAMPLE3)
+        g.unlink(g.nodes[1], g.nodes[3])
+
+        assert(sorted(g.nodes) == [1, 2])
+        assert(g.inDegree == {g.nodes[1]: 0, g.nodes[2]: 1})
+
+        g = Graphius(self.EXAMPLE1)
+        g.postOrderMerge()
+        expected = dict(g.inDegree)
+        g.reindex()
+
+        assert(g.inDegree == expected)
+        assert(g.roots() == g.rootNodes)
+
+    def test_54_bisimulation(self):
+        """ Test the bisimulation engine gives the same result as merge """
+        for example in (self.EXAMPLE1, self.EXAMPLE2, self.EXAMPLE3,
+                        self.lattice(10)):
+            expected = Graphius(example)
+            expected.merge(engine='hashcons')
+            g = Graphius(example)
+            g.merge(engine='bisimulation')
+
+            assert(sortedNodes(g) == sortedNodes(expected))
+
+    def test_55_bisimulation(self):
+        """ Test cycles of equal values collapse to one node """
+        nodes = [
+            {'id': 1, 'value': 'A', 'children': [2]},
+            {'id': 2, 'value': 'A', 'children': [1]},
+            {'id': 3, 'value': 'A', 'children': [3]},
+            {'id': 4, 'value': 'R', 'children': [1, 3, 5]},
+            {'id': 5, 'value': 'A', 'children': [6]},
+            {'id': 6, 'value': 'B', 'children': [5]},
+        ]
+        g = Graphius(nodes)
+        with self.assertRaises(ValueError):
+            g.merge(engine='hashcons')
+
+        g = Graphius(nodes)
+        g.merge(engine='bisimulation')
+
+        assert(sortedNodes(g) == [
+            (3, 'A', [3]), (4, 'R', [3, 5]), (5, 'A', [6]), (6, 'B', [5])])
+
+    def test_56_getNodesColumnar(self):
+        """ Test the columnar output holds the same nodes as getNodes """
+        g = Graphius(self.EXAMPLE1)
+        g.postOrderMerge()
+        columns = g.getNodesColumnar()
+
+        assert(len(columns['offsets']) == len(columns['ids']) + 1)
+        nodes = [
+            {'id': nodeId, 'value': value,
+             'neighbors': columns['neighbors'][start:end]}
+            for nodeId, value, start, end in zip(
+                columns['ids'], columns['values'],
+                columns['offsets'], columns['offsets'][1:])]
+        assert(sortedNodes(g) == sorted(
+            (node['id'], node['value'], sorted(node['neighbors']))
+            for node in nodes))
+
+    def test_57_planMerge(self):
+        """ Test a plan leaves the graph as is, and applying it merges """
+        for engine in ('hashcons', 'bisimulation'):
+            expected = Graphius(self.EXAMPLE1)
+            expected.merge(engine='hashcons')
+            g = Graphius(self.EXAMPLE1)
+            before = sortedNodes(g)
+            plan = g.planMerge(engine)
+
+            assert(sortedNodes(g) == before)
+            assert(sorted(plan) == list(range(1, 14)))
+            assert(plan[3] == plan[9] == 9)
+            assert(plan[1] == 1)
+
+            g.applyPlan(plan)
+            assert(sortedNodes(g) == sortedNodes(expected))
+
+        with self.assertRaises(ValueError):
+            g.planMerge('bruteforce')
+
+    def test_58_applyPlan(self):
+        """ Test a plan replays onto serialized records """
+        from graphius.plan import applyPlan
+        g = Graphius(self.EXAMPLE3)
+        plan = g.planMerge()
+        records = list(applyPlan(self.EXAMPLE3, plan))
+        written = list(applyPlan(g.getNodes(), plan))
+        g.applyPlan(plan)
+
+        expected = sortedNodes(g)
+        assert(sorted(
+            (r['id'], r['value'], sorted(r['children']))
+            for r in records) == expected)
+        assert(sorted(
+            (r['id'], r['value'], sorted(r['neighbors']))
+            for r in written) == expected)
+
+    def test_59_cycle(self):
+        """ Test postOrderMerge fails fast on a cycle below a root """
+        nodes = [
+            {'id': 1, 'value': 'R', 'children': [2]},
+            {'id': 2, 'value': 'A', 'children': [3]},
+            {'id': 3, 'value': 'B', 'children': [2]},
+        ]
+        g = Graphius(nodes)
+        with self.assertRaises(ValueError):
+            g.postOrderMerge()
+
+    def test_60_update(self):
+        """ Test a root that gains a parent is merged like any other node """
+        g = Graphius([
+            {'id': 1, 'value': 'A', 'children': [2]},
+            {'id': 2, 'value': 'B', 'children': []},
+        ])
+        g.postOrderMerge()
+        g.update([{'id': 9, 'value': 'B', 'children': []}])
+        assert(len(g.nodes) == 3)
+
+        g.update(edges=[(1, 9)])
+        assert(sortedNodes(g) == [(1, 'A', [2]), (2, 'B', [])])
+
+        # Random updates never leave two identical nodes below the roots
+        for seed in range(20):
+            rng = random.Random(seed)
+            g = Graphius([
+                {'id': i, 'value': rng.choice('AB'),
+                 'children': [
+                     j for j in range(i + 1, 12) if rng.random() < 0.2]}
+                for i in range(12)])
+            g.postOrderMerge()
+            for step in range(5):
+                nodeId = 12 + step
+                record = {
+                    'id': nodeId, 'value': rng.choice('AB'), 'children': []}
+                g.update(
+                    [record],
+                    edges=[(rng.choice(list(g.nodes)), nodeId)]
+                    if rng.random() < 0.5 else [])
+            classes = g.signatures()
+            roots = g.roots()
+            inner = [
+                classes[nodeObj.id] for nodeObj in g.nodes.values()
+                if nodeObj not in roots]
+            assert(len(inner) == len(set(inner)))
+
+    def test_61_clean(self):
+        """ Test clean keeps roots and edges consistent with the nodes """
+        g = Graphius([
+            {'id': 1, 'value': 'A', 'children': [3]},
+            {'id': 2, 'value': 'B', 'children': []},
+            {'id': 3, 'value': 'B', 'children': []},
+        ], stats=True)
+        g.markMerged(g.nodes[3])
+        g.clean()
+
+        assert(sorted(g.nodes) == [1, 2])
+        assert(g.stats['removed'] == 1 and 'clean' in g.stats['seconds'])
+        assert(g.roots() == {g.nodes[1], g.nodes[2]})
+        assert(sortedNodes(g) == [(1, 'A', []), (2, 'B', [])])
+
+        g.postOrderMerge()
+        assert(sortedNodes(g) == [(1, 'A', []), (2, 'B', [])])
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the parallel merge of `graphius` package."""
+
+
+import unittest
+
+from graphius.digest import nodeDigest, recordDigests
+from graphius.graphius import Graphius
+from graphius.parallel import batches, components
+from tests import sortedNodes, test_graphius
+
+
+class TestParallel(unittest.TestCase):
+    """Tests for `graphius.parallel` and `graphius.digest` modules."""
+    EXAMPLE1 = test_graphius.TestGraphius.EXAMPLE1
+    EXAMPLE2 = test_graphius.TestGraphius.EXAMPLE2
+    EXAMPLE3 = test_graphius.TestGraphius.EXAMPLE3
+
+    def test_1_components(self):
+        """ Test the two halves of example 1 are separate components """
+        g = Graphius(self.EXAMPLE1)
+        parts = sorted(
+            sorted(node.id for node in part) for part in components(g))
+
+        assert(parts == [[1, 2, 3, 4, 5, 6, 7], [8, 9, 10, 11, 12, 13]])
+
+    def test_2_batches(self):
+        """ Test batches keep components whole """
+        g = Graphius(self.EXAMPLE1)
+        work = batches(components(g), 8)
+
+        assert(len(work) == 2)
+        assert(sorted(len(batch) for batch in work) == [6, 7])
+
+    def test_3_nodeDigest(self):
+        """ Test digests ignore child order and repeats """
+        a, b = nodeDigest('A', []), nodeDigest('B', [])
+
+        assert(nodeDigest('C', [a, b]) == nodeDigest('C', [b, a, b]))
+        assert(nodeDigest('C', [a]) != nodeDigest('C', [b]))
+        assert(nodeDigest(1, []) != nodeDigest('1', []))
+
+    def test_4_recordDigests(self):
+        """ Test digests match signatures on example 2 """
+        g = Graphius(self.EXAMPLE2)
+        classes = g.signatures()
+        digests = recordDigests([
+            (node['id'], node['value'], node['children'])
+            for node in self.EXAMPLE2])
+
+        for i in classes:
+            for j in classes:
+                assert(
+                    (classes[i] == classes[j]) == (digests[i] == digests[j]))
+
+    def test_5_recordDigests(self):
+        """ Test cycles raise ValueError """
+        with self.assertRaises(ValueError):
+            recordDigests([(1, 'A', [2]), (2, 'B', [1])])
+
+    def test_6_parallelMerge(self):
+        """ Test the parallel engine gives the same result as merge """
+        for example in (self.EXAMPLE1, self.EXAMPLE2, self.EXAMPLE3):
+            expected = Graphius(example)
+            expected.merge()
+            g = Graphius(example)
+            g.merge(engine='parallel', workers=2)
+
+            assert(sortedNodes(g) == sortedNodes(expected))
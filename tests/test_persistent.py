@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the persistent graphs of `graphius` package."""
+
+
+import random
+import unittest
+
+from graphius.graphius import Graphius
+from graphius.persistent import PersistentGraph, PersistentMap
+from tests import sortedNodes, test_graphius
+
+
+class Colliding(object):
+    """ A key whose hash collides with every other Colliding key """
+    def __init__(self, name):
+        self.name = name
+
+    def __hash__(self):
+        return 7
+
+    def __eq__(self, other):
+        return isinstance(other, Colliding) and self.name == other.name
+
+
+class TestPersistent(unittest.TestCase):
+    """Tests for `graphius.persistent` module."""
+    EXAMPLE1 = test_graphius.TestGraphius.EXAMPLE1
+    EXAMPLE3 = test_graphius.TestGraphius.EXAMPLE3
+
+    def test_1_map(self):
+        """ Test the map agrees with a dict, and old maps never change """
+        rng = random.Random(5)
+        expected = {}
+        m = PersistentMap()
+        versions = []
+        for _ in range(3000):
+            key = rng.randrange(500)
+            if key in expected and rng.random() < 0.4:
+                del expected[key]
+                m = m.delete(key)
+            else:
+                expected[key] = rng.random()
+                m = m.set(key, expected[key])
+            versions.append((m, dict(expected)))
+
+        for m, expected in versions[::100]:
+            assert(len(m) == len(expected))
+            assert(dict(m.items()) == expected)
+            assert(all(m[key] == value for key, value in expected.items()))
+        assert(dict(PersistentMap.fromItems(expected.items()).items()) ==
+               expected)
+        with self.assertRaises(KeyError):
+            m.delete(500)
+
+    def test_2_collisions(self):
+        """ Test keys with equal hashes are kept apart """
+        keys = [Colliding(name) for name in 'abcd']
+        m = PersistentMap.fromItems((key, key.name) for key in keys)
+        m = m.set(Colliding('e'), 'e').delete(Colliding('b'))
+
+        assert(len(m) == 4)
+        assert(sorted(m.values()) == ['a', 'c', 'd', 'e'])
+        assert(Colliding('b') not in m)
+        assert(m.get(Colliding('c')) == 'c')
+
+    def test_3_freeze(self):
+        """ Test a frozen graph holds the same nodes, and thaws back """
+        g = Graphius(self.EXAMPLE1)
+        v = g.freeze()
+
+        assert(sortedNodes(v) == sortedNodes(g))
+        assert(v.roots() == {node.id for node in g.roots()})
+        assert(sortedNodes(v.thaw()) == sortedNodes(g))
+        with self.assertRaises(KeyError):
+            PersistentGraph.fromRecords(
+                [{'id': 1, 'value': 'A', 'children': [2]}])
+
+    def test_4_edits(self):
+        """ Test edits leave older versions alone and share their nodes """
+        v1 = PersistentGraph.fromRecords(self.EXAMPLE1)
+        before = sortedNodes(v1)
+        v2 = v1.setValue(8, 'Z').addEdge(1, 8).removeEdge(3, 5)
+        v3 = v2.addNode(14, 'N', [2]).removeNode(13)
+
+        assert(sortedNodes(v1) == before)
+        assert(v2[8].value == 'Z' and v2[1].neighbors == {2, 3, 8})
+        assert(5 in v2.roots())
+        assert(14 in v3 and 13 not in v3 and v3[11].neighbors == set())
+        for nodeId in (2, 4, 6, 7, 9, 10, 12):
+            assert(v1[nodeId] is v2[nodeId] is v3[nodeId])
+        with self.assertRaises(ValueError):
+            v3.addNode(1, 'A')
+        with self.assertRaises(KeyError):
+            v3.addEdge(1, 13)
+
+    def test_5_merge(self):
+        """ Test merging gives the same graph as merge, copying only the
+        nodes whose neighbors changed """
+        for example in (self.EXAMPLE1, self.EXAMPLE3):
+            expected = Graphius(example)
+            expected.merge(engine='hashcons')
+            v1 = PersistentGraph.fromRecords(example)
+            before = sortedNodes(v1)
+            v2 = v1.merge()
+
+            assert(sortedNodes(v2) == sortedNodes(expected))
+            assert(sortedNodes(v1) == before)
+
+            copied = {
+                nodeId for nodeId in v2.nodes if v2[nodeId] is not v1[nodeId]}
+            assert(copied == {
+                nodeId for nodeId in v2.nodes
+                if v2[nodeId].neighbors != v1[nodeId].neighbors})
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the equivalence queries of `graphius` package."""
+
+
+import unittest
+
+from graphius.graphius import Graphius
+from tests import test_graphius
+
+
+class TestQuery(unittest.TestCase):
+    """Tests for `graphius.query` module."""
+    EXAMPLE1 = test_graphius.TestGraphius.EXAMPLE1
+
+    def test_1_isSameTree(self):
+        """ Test the second half of example 1 repeats the first """
+        q = Graphius(self.EXAMPLE1).query()
+
+        assert(q.isSameTree(3, 9))
+        assert(q.isSameTree(6, 13))
+        assert(not q.isSameTree(2, 8))
+        assert(q.equivalenceClass(4) == (11, 4))
+        assert(q.equivalenceClass(1) == (1,))
+
+    def test_2_canonicalOf(self):
+        """ Test original ids map to the nodes kept by a merge """
+        for engine in ('hashcons', 'bisimulation', None):
+            g = Graphius(self.EXAMPLE1)
+            q = g.query()
+            if engine is None:
+                g.postOrderMerge()
+            else:
+                g.merge(engine=engine)
+
+            for nodeId in range(1, 14):
+                canonical = q.canonicalOf(nodeId)
+                assert(canonical in g.nodes)
+                assert(q.isSameTree(nodeId, canonical))
+            assert(q.canonicalOf(1) == 1)
+
+    def test_3_clean(self):
+        """ Test removed nodes are skipped when picking canonical nodes """
+        g = Graphius(self.EXAMPLE1)
+        q = g.query()
+
+        assert(q.canonicalOf(3) == 3)
+        g.nodes[9].safe = False
+        g.nodes[3].safe = False
+        g.clean()
+        assert(q.canonicalOf(3) is None)
+        assert(q.canonicalOf(4) == 4)
+
+    def test_4_missing(self):
+        """ Test ids that were never in the graph raise KeyError """
+        q = Graphius(self.EXAMPLE1).query()
+        with self.assertRaises(KeyError):
+            q.canonicalOf(99)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the duplicate subtree report of `graphius` package."""
+
+
+import time
+import unittest
+
+from graphius.graphius import Graphius
+from tests import test_graphius
+
+
+class TestReport(unittest.TestCase):
+    """Tests for `graphius.report` module."""
+    EXAMPLE1 = test_graphius.TestGraphius.EXAMPLE1
+    EXAMPLE3 = test_graphius.TestGraphius.EXAMPLE3
+
+    def test_1_duplicateReport(self):
+        """ Test the repeated half of example 1 comes first, and saves
+        the nodes nested in it """
+        report = Graphius(self.EXAMPLE1).duplicateReport()
+
+        assert(report['nodes'] == 13)
+        assert(report['classes'] == 8)
+        assert(report['removable'] == 5)
+        assert(report['duplicates'][0] == {
+            'value': 'C', 'example': 9, 'occurrences': 2,
+            'size': 5, 'saved': 5})
+        assert([row['saved'] for row in report['duplicates']] ==
+               [5, 0, 0, 0, 0])
+
+    def test_2_top(self):
+        """ Test top keeps the rows with the largest savings """
+        g = Graphius(self.EXAMPLE1)
+
+        assert(g.duplicateReport(top=1)['duplicates'] ==
+               g.duplicateReport(top=None)['duplicates'][:1])
+        assert(len(g.duplicateReport(top=2)['duplicates']) == 2)
+
+    def test_3_unchanged(self):
+        """ Test the report does not merge anything """
+        g = Graphius(self.EXAMPLE3)
+        report = g.duplicateReport()
+
+        assert(len(g.nodes) == 4)
+        assert(report['duplicates'] == [{
+            'value': 'B', 'example': 4, 'occurrences': 2,
+            'size': 1, 'saved': 1}])
+
+    def test_4_dag(self):
+        """ Test descendants the copies already share are charged once """
+        nodes = [
+            {'id': 1, 'value': 'X', 'children': [2, 3, 5]},
+            {'id': 2, 'value': 'A', 'children': [4]},
+            {'id': 3, 'value': 'A', 'children': [4]},
+            {'id': 4, 'value': 'B', 'children': []},
+            {'id': 5, 'value': 'A', 'children': [6]},
+            {'id': 6, 'value': 'B', 'children': []},
+        ]
+        report = Graphius(nodes).duplicateReport()
+
+        assert(report['removable'] == 3)
+        assert(report['duplicates'] == [
+            {'value': 'A', 'example': 5, 'occurrences': 3,
+             'size': 2, 'saved': 3},
+            {'value': 'B', 'example': 6, 'occurrences': 2,
+             'size': 1, 'saved': 0}])
+        assert(Graphius(nodes).duplicateReport(top=1)['duplicates'] ==
+               report['duplicates'][:1])
+        assert(Graphius(nodes).duplicateReport(top=0)['duplicates'] == [])
+
+    def lattice(self, offset, depth):
+        """ Return records of a lattice whose two nodes at each level both
+        point at the two nodes of the next level, under one top node """
+        nodes = [{'id': offset, 'value': 'T', 'children': [offset + 1,
+                                                           offset + 2]}]
+        for level in range(depth):
+            first = offset + 1 + 2 * level
+            below = [first + 2, first + 3] if level < depth - 1 else []
+            nodes.append({'id': first, 'value': 'L', 'children': below})
+            nodes.append({'id': first + 1, 'value': 'R', 'children': below})
+        return nodes
+
+    def test_5_linear(self):
+        """ Test deep duplicated chains and lattices are reported in linear
+        time, with sizes that do not count shared descendants again """
+        depth = 4000
+        chain = [
+            {'id': i, 'value': 'A', 'children': [i + 1] if i % depth else []}
+            for i in range(1, 2 * depth + 1)]
+        lattices = self.lattice(0, depth) + self.lattice(2 * depth + 1, depth)
+
+        start = time.time()
+        report = Graphius(chain).duplicateReport(top=None)
+        assert(report['duplicates'][0] == {
+            'value': 'A', 'example': depth + 1, 'occurrences': 2,
+            'size': depth, 'saved': depth})
+        assert(sum(row['saved'] for row in report['duplicates']) == depth)
+
+        for top in (None, 10):
+            report = Graphius(lattices).duplicateReport(top=top)
+            assert(report['duplicates'][0] == {
+                'value': 'T', 'example': 2 * depth + 1, 'occurrences': 2,
+                'size': 2 * depth + 1, 'saved': 2 * depth + 1})
+            assert(report['duplicates'][1]['saved'] == 0)
+        assert(time.time() - start < 5)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the merge service of `graphius` package."""
+
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from graphius.server import MergeServer, mergeRecords
+from tests import test_graphius
+
+
+class TestServer(unittest.TestCase):
+    """Tests for `graphius.server` module."""
+    EXAMPLE3 = test_graphius.TestGraphius.EXAMPLE3
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'graphius.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    async def request(self, method, target, body=None):
+        """ Send one request over the Unix socket.
+        returns the status code and the decoded JSON body """
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        payload = b'' if body is None else json.dumps(body).encode()
+        writer.write(
+            "{} {} HTTP/1.1\r\nContent-Length: {}\r\n\r\n".format(
+                method, target, len(payload)).encode() + payload)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, data = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(data.decode())
+
+    def run_server(self, server, client):
+        """ Run the client coroutine against a started server """
+        async def main():
+            listener = await server.start(path=self.path)
+            async with listener:
+                return await client()
+        try:
+            return asyncio.run(main())
+        finally:
+            server.close()
+
+    def test_1_merge(self):
+        """ Test merging example 3 and reading the metrics """
+        server = MergeServer(executor=ThreadPoolExecutor(2))
+
+        async def client():
+            merged = await self.request('POST', '/merge', self.EXAMPLE3)
+            metrics = await self.request('GET', '/metrics')
+            return merged, metrics
+
+        (status, nodes), (_, metrics) = self.run_server(server, client)
+
+        assert(status == 200)
+        assert(len(nodes) == 3)
+        assert(metrics['merges'] == 1)
+        assert(metrics['latency']['count'] == 1)
+        assert(metrics['latency']['max'] > 0)
+
+    def test_2_errors(self):
+        """ Test bad requests get 4xx without stopping the server """
+        server = MergeServer(executor=ThreadPoolExecutor(1))
+
+        async def client():
+            return [
+                await self.request('POST', '/merge', [
+                    {'id': 1, 'value': 'A', 'children': [2]}]),
+                await self.request('GET', '/merge'),
+                await self.request('GET', '/other'),
+                await self.request('POST', '/merge', self.EXAMPLE3),
+            ]
+
+        statuses = [status for status, _ in self.run_server(server, client)]
+
+        assert(statuses == [400, 405, 404, 200])
+        assert(server.counts['errors'] == 3)
+
+    def test_3_backpressure(self):
+        """ Test merges past maxPending are refused with 503 """
+        release = threading.Event()
+
+        def blocked(records):
+            release.wait()
+            return mergeRecords(records)
+
+        server = MergeServer(
+            maxPending=1, executor=ThreadPoolExecutor(1), function=blocked)
+
+        async def client():
+            first = asyncio.ensure_future(
+                self.request('POST', '/merge', self.EXAMPLE3))
+            while not server.pending:
+                await asyncio.sleep(0.01)
+            second = await self.request('POST', '/merge', self.EXAMPLE3)
+            release.set()
+            return await first, second
+
+        (first, _), (second, _) = self.run_server(server, client)
+
+        assert(first == 200)
+        assert(second == 503)
+        assert(server.counts['rejected'] == 1)
+
+    def test_4_backpressure(self):
+        """ Test refused merges get 503 before their body is sent """
+        release = threading.Event()
+
+        def blocked(records):
+            release.wait()
+            return mergeRecords(records)
+
+        server = MergeServer(
+            maxPending=1, executor=ThreadPoolExecutor(1), function=blocked)
+
+        async def client():
+            first = asyncio.ensure_future(
+                self.request('POST', '/merge', self.EXAMPLE3))
+            while not server.pending:
+                await asyncio.sleep(0.01)
+
+            # Headers only, the server must answer without the body
+            reader, writer = await asyncio.open_unix_connection(self.path)
+            writer.write(
+                b"POST /merge HTTP/1.1\r\nContent-Length: 1000000\r\n\r\n")
+            response = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            release.set()
+            return await first, int(response.split()[1])
+
+        (first, _), second = self.run_server(server, client)
+
+        assert(first == 200)
+        assert(second == 503)
+
+    def test_5_errors(self):
+        """ Test oversized bodies get 413 and executor failures 500 """
+        def broken(records):
+            raise RuntimeError("worker died")
+
+        server = MergeServer(
+            executor=ThreadPoolExecutor(1), function=broken, maxBody=100)
+
+        async def client():
+            return [
+                await self.request('POST', '/merge', self.EXAMPLE3),
+                await self.request('POST', '/merge', []),
+                await self.request('GET', '/metrics'),
+            ]
+
+        (large, _), (failed, body), (metrics, _) = self.run_server(
+            server, client)
+
+        assert((large, failed, metrics) == (413, 500, 200))
+        assert('worker died' in body['error'])
+
+    def test_6_processes(self):
+        """ Test the default process pool, whose workers must not keep
+        client connections open """
+        server = MergeServer(workers=1)
+
+        async def client():
+            return await asyncio.wait_for(
+                self.request('POST', '/merge', self.EXAMPLE3), 30)
+
+        status, nodes = self.run_server(server, client)
+
+        assert(status == 200)
+        assert(len(nodes) == 3)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for binary snapshots of `graphius` package."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from graphius.csr import CSRGraphius
+from graphius.graphius import Graphius
+from tests import sortedNodes, test_graphius
+
+
+class TestSnapshot(unittest.TestCase):
+    """Tests for `graphius.snapshot` module."""
+    EXAMPLE1 = test_graphius.TestGraphius.EXAMPLE1
+
+    def setUp(self):
+        """Make a directory for snapshot files."""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'graph.bin')
+
+    def tearDown(self):
+        """Remove the snapshot files."""
+        shutil.rmtree(self.directory)
+
+    def test_1_save_binary(self):
+        """ Test a round trip from both backends """
+        for backend in ('objects', 'csr'):
+            g = Graphius(self.EXAMPLE1, backend=backend)
+            g.save_binary(self.path)
+            loaded = Graphius.load_binary(self.path)
+
+            assert(type(loaded) is CSRGraphius)
+            assert(sortedNodes(loaded) == sortedNodes(g))
+
+    def test_2_load_binary(self):
+        """ Test read only queries run on the mapped arrays """
+        Graphius(self.EXAMPLE1).save_binary(self.path)
+        g = Graphius.load_binary(self.path)
+
+        assert(type(g.ids) is memoryview)
+        assert({node.id for node in g.roots()} == {1, 8})
+        assert(g.nodes[9].value == 'C')
+        assert(g.values.decoded.keys() == {2})
+
+    def test_3_load_binary(self):
+        """ Test merging a loaded graph, and saving it again """
+        g = Graphius(self.EXAMPLE1)
+        g.save_binary(self.path)
+        g.merge(engine='hashcons')
+        loaded = Graphius.load_binary(self.path)
+        loaded.merge(engine='hashcons')
+
+        assert(sortedNodes(loaded) == sortedNodes(g))
+        loaded.save_binary(self.path + '2')
+        again = Graphius.load_binary(self.path + '2')
+        assert(sortedNodes(again) == sortedNodes(g))
+
+    def test_4_load_binary(self):
+        """ Test values of other JSON types survive """
+        nodes = [
+            {'id': 1, 'value': None, 'children': [2]},
+            {'id': 2, 'value': 7, 'children': [3]},
+            {'id': 3, 'value': u'é', 'children': []},
+        ]
+        Graphius(nodes, backend='csr').save_binary(self.path)
+        g = Graphius.load_binary(self.path)
+
+        assert(list(g.values) == [None, 7, u'é'])
+
+    def test_5_load_binary(self):
+        """ Test other files are rejected """
+        with open(self.path, 'wb') as fp:
+            fp.write(b'not a graph at all, not even close')
+        with self.assertRaises(ValueError):
+            Graphius.load_binary(self.path)
+
+        Graphius(self.EXAMPLE1).save_binary(self.path)
+        with open(self.path, 'ab') as fp:
+            fp.write(b'extra')
+        with self.assertRaises(ValueError):
+            Graphius.load_binary(self.path)
+
+    def test_6_save_binary(self):
+        """ Test a loaded snapshot can be saved over its own file """
+        Graphius(self.EXAMPLE1).save_binary(self.path)
+        g = Graphius.load_binary(self.path)
+        expected = sortedNodes(g)
+        g.save_binary(self.path)
+
+        assert(sortedNodes(g) == expected)
+        assert(sortedNodes(Graphius.load_binary(self.path)) == expected)
+        assert(os.listdir(self.directory) == ['graph.bin'])
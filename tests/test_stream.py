@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for streaming input and output of `graphius` package."""
+
+
+import io
+import json
+import unittest
+
+from graphius.graphius import Graphius
+from graphius.stream import iterRecords, writeRecords
+from tests import test_graphius
+
+
+class TestStream(unittest.TestCase):
+    """Tests for `graphius.stream` module."""
+
+    def ndjson(self, nodes):
+        """ Returns nodes as newline delimited JSON """
+        return ''.join(json.dumps(node) + '\n' for node in nodes)
+
+    def test_1_iterRecords(self):
+        """ Test reading a JSON array in chunks smaller than a record """
+        text = json.dumps(test_graphius.TestGraphius.EXAMPLE1, indent=4)
+
+        for chunkSize in (1, 7, 1 << 16):
+            records = list(iterRecords(io.StringIO(text), chunkSize))
+            assert(records == test_graphius.TestGraphius.EXAMPLE1)
+
+    def test_2_iterRecords(self):
+        """ Test reading newline delimited JSON """
+        text = self.ndjson(test_graphius.TestGraphius.EXAMPLE2)
+
+        for chunkSize in (1, 7, 1 << 16):
+            records = list(iterRecords(io.StringIO(text), chunkSize))
+            assert(records == test_graphius.TestGraphius.EXAMPLE2)
+
+    def test_3_iterRecords(self):
+        """ Test empty inputs """
+        assert(list(iterRecords(io.StringIO(''))) == [])
+        assert(list(iterRecords(io.StringIO('  \n'))) == [])
+        assert(list(iterRecords(io.StringIO(' [ ] '))) == [])
+
+    def test_4_iterRecords(self):
+        """ Test malformed arrays raise ValueError """
+        for text in ('[{"id": 1}', '[{"id": 1} {"id": 2}]', '[{"id": '):
+            with self.assertRaises(ValueError):
+                list(iterRecords(io.StringIO(text), 4))
+
+    def test_5_from_stream(self):
+        """ Test children listed before their own records """
+        nodes = list(reversed(test_graphius.TestGraphius.EXAMPLE1))
+        g = Graphius.from_stream(io.StringIO(self.ndjson(nodes)))
+
+        assert(g.nodes[3] in g.nodes[1].neighbors)
+        g.postOrderMerge()
+        assert(len(g.nodes) == 8)
+
+    def test_6_from_stream(self):
+        """ Test streaming into the CSR backend """
+        text = json.dumps(test_graphius.TestGraphius.EXAMPLE3)
+        g = Graphius.from_stream(io.StringIO(text), backend='csr')
+        g.postOrderMerge()
+
+        assert(len(g.nodes) == 3)
+
+    def test_7_from_stream(self):
+        """ Test children that never arrive raise KeyError """
+        text = self.ndjson([{'id': 1, 'value': 'A', 'children': [2]}])
+        with self.assertRaises(KeyError):
+            Graphius.from_stream(io.StringIO(text))
+
+    def test_8_writeRecords(self):
+        """ Test JSON array output matches json.dumps """
+        g = Graphius(test_graphius.TestGraphius.EXAMPLE1)
+        g.postOrderMerge()
+
+        for chunkSize in (1, 50, 1 << 16):
+            out = io.StringIO()
+            count = writeRecords(out, g.iterNodes(), 'json', chunkSize)
+            assert(count == 8)
+            assert(out.getvalue() == json.dumps(g.getNodes()))
+
+    def test_9_writeRecords(self):
+        """ Test newline delimited output reads back as the same nodes """
+        g = Graphius(test_graphius.TestGraphius.EXAMPLE2, backend='csr')
+        out = io.StringIO()
+        writeRecords(out, g.iterNodes(), 'ndjson', 10)
+
+        assert(out.getvalue().count('\n') == 13)
+        assert(list(iterRecords(io.StringIO(out.getvalue()))) ==
+               g.getNodes())
+
+    def test_10_writeRecords(self):
+        """ Test empty output, and unknown formats """
+        out = io.StringIO()
+        writeRecords(out, iter([]), 'json')
+        writeRecords(out, iter([]), 'ndjson')
+        assert(out.getvalue() == '[]')
+
+        with self.assertRaises(ValueError):
+            writeRecords(out, iter([]), 'xml')
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the vectorized engine of `graphius` package."""
+
+
+import unittest
+
+from graphius.graphius import Graphius
+from graphius.vectorized import levelClasses, levels, rowIds
+from tests import test_graphius
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class TestVectorized(unittest.TestCase):
+    """Tests for `graphius.vectorized` module."""
+
+    def test_1_levels(self):
+        """ Test grouping example 1 by height """
+        g = Graphius(test_graphius.TestGraphius.EXAMPLE1, backend='csr')
+        heights = [
+            sorted(g.ids[i] for i in level)
+            for level in levels(g.offsets, g.children)]
+
+        assert(heights == [[2, 6, 7, 12, 13], [4, 5, 10, 11], [3, 9], [1, 8]])
+
+    def test_2_levels(self):
+        """ Test cycles raise ValueError """
+        with self.assertRaises(ValueError):
+            levels(numpy.array([0, 1, 2]), numpy.array([1, 0]))
+
+    def test_3_rowIds(self):
+        """ Test numbering rows, with keys too wide to pack """
+        for big in (10, 1 << 40):
+            keys = numpy.array(
+                [[1, big, 2], [0, 0, 0], [1, big, 2], [1, 0, 2]])
+            ids, count = rowIds(numpy, keys)
+
+            assert(count == 3)
+            assert(ids[0] == ids[2])
+            assert(len({ids[0], ids[1], ids[3]}) == 3)
+
+    def test_4_levelClasses(self):
+        """ Test classes match signatures on example 1 """
+        g = Graphius(test_graphius.TestGraphius.EXAMPLE1, backend='csr')
+        classes = levelClasses(g.codes, g.offsets, g.children)
+        signatures = g.positionClasses()
+
+        for i in range(len(classes)):
+            for j in range(len(classes)):
+                assert(
+                    (classes[i] == classes[j]) ==
+                    (signatures[i] == signatures[j]))